@@ -0,0 +1,113 @@
+"""
+    Asset registry.
+    Sounds and images are registered here by name and only decoded the first time something asks for them.
+    Every module gets the same handle back, so an asset is never decoded (or kept in memory) twice.
+"""
+
+import threading
+
+import pygame
+
+
+class AssetSpec:
+    def __init__(self,name,kind,loader,source=None):
+        self.name = name
+        # 'sound', 'image' or 'font'
+        self.kind = kind
+        # called with no arguments to decode the asset, may return None if it cant be loaded
+        self.loader = loader
+        # where it comes from (usually a path), only used for reports
+        self.source = source
+
+
+_specs = {}
+_loaded = {}
+# stands in for "not loaded yet", None is a valid result for an asset that failed to load
+_MISSING = object()
+# decoding can happen on the warm up thread and the main thread at once.
+# _lock guards the dicts, each asset has its own lock so waiting for one asset never waits on another one being decoded
+_lock = threading.RLock()
+_asset_locks = {}
+
+""" Registers an asset under `name`. Registering a name again keeps the first registration (and whatever it already loaded) """
+def register(name,kind,loader,source=None):
+    with _lock:
+        if name not in _specs:
+            _specs[name] = AssetSpec(name,kind,loader,source)
+
+def register_sound(name,path,volume:float=1.0):
+    def load():
+        sound = pygame.mixer.Sound(path)
+        sound.set_volume(volume)
+        return sound
+    register(name,'sound',load,path)
+
+""" The asset called `name`, decoding it if this is the first time it is asked for """
+def get(name):
+    asset = _loaded.get(name,_MISSING)
+    if asset is not _MISSING:
+        return asset
+    with _lock:
+        spec = _specs[name]
+        asset_lock = _asset_locks.setdefault(name,threading.Lock())
+    with asset_lock:
+        # someone else may have loaded it while we waited for the lock
+        if name in _loaded:
+            return _loaded[name]
+        asset = spec.loader()
+        with _lock:
+            _loaded[name] = asset
+        return asset
+
+def is_loaded(name) -> bool:
+    return name in _loaded
+
+""" Roughly how many bytes a decoded asset takes up, None if we cant tell """
+def asset_size(asset):
+    if isinstance(asset,pygame.Surface):
+        return asset.get_pitch() * asset.get_height()
+    if isinstance(asset,pygame.mixer.Sound):
+        init = pygame.mixer.get_init()
+        if not init: return None
+        freq,size,channels = init
+        return int(asset.get_length() * freq) * channels * (abs(size)//8)
+    return None
+
+""" RETURNS [(name,kind,source,loaded,bytes)] for every registered asset, bytes is None for ones that arent loaded """
+def memory_report() -> list:
+    with _lock:
+        report = []
+        for name,spec in _specs.items():
+            loaded = name in _loaded
+            size = asset_size(_loaded[name]) if loaded else None
+            report.append((name,spec.kind,spec.source,loaded,size))
+        return report
+
+def format_memory_report() -> str:
+    lines = []
+    total = 0
+    for name,kind,source,loaded,size in memory_report():
+        if size: total += size
+        state = '{:.1f} KiB'.format(size/1024) if size is not None else ('loaded' if loaded else 'not loaded')
+        lines.append('{:<16} {:<6} {:>12}  {}'.format(name,kind,state,source or ''))
+    lines.append('{:<16} {:<6} {:>12}'.format('total','','{:.1f} KiB'.format(total/1024)))
+    return '\n'.join(lines)
+
+"""
+    Decodes assets on a background thread so they are ready before anything asks for them.
+    Only sounds by default: images get converted for the display, which has to happen on the main thread.
+    RETURNS the thread
+"""
+def warm(names=None,kinds=('sound',)):
+    with _lock:
+        if names is None:
+            names = [name for name,spec in _specs.items() if spec.kind in kinds]
+    def run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print('Could not load asset {}: {}'.format(name,e))
+    thread = threading.Thread(target=run,name='asset-warmup',daemon=True)
+    thread.start()
+    return thread
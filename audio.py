@@ -0,0 +1,80 @@
+"""
+    Sound effects. Sounds live in the asset registry and are only decoded the first time they are played,
+    so importing the game modules does not need a mixer.
+"""
+
+import threading
+
+import pygame
+
+import assets
+import tracing
+from physics import PhysicsEvent
+
+SOUNDS = {
+    'start':  ("assets/audio/start.wav",1),
+    'hit':    ("assets/audio/hit.wav",0.7),
+    'bounce': ("assets/audio/collisions.mp3",1.5),
+    'putt':   ("assets/audio/applause.mp3",1),
+}
+
+for _name,(_path,_volume) in SOUNDS.items():
+    assets.register_sound(_name,_path,_volume)
+
+def get_sound(name) -> pygame.mixer.Sound:
+    return assets.get(name)
+
+def play(name):
+    if not pygame.mixer.get_init(): return
+    with tracing.span('play sound','audio',sound=name):
+        get_sound(name).play()
+
+# sounds play_soon is still decoding, stop() takes them out so they dont start playing after being stopped
+_pending = set()
+# the threads doing the decoding, shutdown() waits for them
+_threads = []
+
+""" Same as play, but a sound that isnt decoded yet gets decoded on another thread and played from there instead of holding up the frame """
+def play_soon(name):
+    if not pygame.mixer.get_init(): return
+    if assets.is_loaded(name):
+        with tracing.span('play sound','audio',sound=name):
+            get_sound(name).play()
+        return
+    _pending.add(name)
+    def run():
+        with tracing.span('decode sound','audio',sound=name):
+            sound = get_sound(name)
+        if name in _pending:
+            _pending.discard(name)
+            sound.play()
+    thread = threading.Thread(target=run,name='play-'+name,daemon=True)
+    _threads.append(thread)
+    thread.start()
+
+def stop(name):
+    _pending.discard(name)
+    # nothing to stop if it was never loaded
+    if not pygame.mixer.get_init() or not assets.is_loaded(name): return
+    get_sound(name).stop()
+
+""" Waits for sounds that are still decoding without playing them, the mixer must not be shut down while one is """
+def shutdown():
+    _pending.clear()
+    while _threads:
+        _threads.pop().join()
+
+def on_shot(ball):
+    play('hit')
+
+def on_bounce(ball,obj):
+    play('bounce')
+
+def on_holed(ball):
+    play('putt')
+
+""" Hooks the gameplay sounds up to a level's physics events """
+def subscribe(events):
+    events.subscribe(PhysicsEvent.Shot,on_shot)
+    events.subscribe(PhysicsEvent.Bounce,on_bounce)
+    events.subscribe(PhysicsEvent.Holed,on_holed)
@@ -0,0 +1,71 @@
+"""
+    Static geometry baking.
+    Editor levels are made of lots of 30x30 StaticBlocks side by side. At load time we merge blocks that touch
+    into as few larger rectangles as we can, and collide with and draw those instead.
+"""
+
+from block import Block, StaticBlock, MovingBlock
+
+
+""" Merges rects that line up along `axis` (0 = rows, 1 = columns) and touch or overlap. rects are [x,y,w,h,order] lists """
+def merge_pass(rects,axis):
+    pos,size = (0,2) if axis == 0 else (1,3)
+    other_pos,other_size = (1,3) if axis == 0 else (0,2)
+    lines = {}
+    for r in rects:
+        lines.setdefault((r[other_pos],r[other_size]),[]).append(r)
+
+    merged = []
+    changed = False
+    for line in lines.values():
+        line.sort(key=lambda r: r[pos])
+        cur = line[0]
+        for r in line[1:]:
+            if r[pos] <= cur[pos] + cur[size]:
+                cur[size] = max(cur[pos] + cur[size],r[pos] + r[size]) - cur[pos]
+                cur[4] = min(cur[4],r[4])
+                changed = True
+            else:
+                merged.append(cur)
+                cur = r
+        merged.append(cur)
+    return merged,changed
+
+"""
+    Merges touching axis aligned rects into larger ones covering exactly the same area.
+    `rects` is a list of (x,y,w,h). RETURNS a list of (x,y,w,h,order) where order is the smallest index of the rects that went into it
+"""
+def merge_rects(rects) -> list:
+    merged = [[r[0],r[1],r[2],r[3],i] for i,r in enumerate(rects) if r[2] > 0 and r[3] > 0]
+    if not merged: return []
+    # rows first, then columns, until neither pass finds anything left to merge
+    axis = 0
+    passes_without_change = 0
+    while passes_without_change < 2:
+        merged,changed = merge_pass(merged,axis)
+        passes_without_change = 0 if changed else passes_without_change + 1
+        axis = 1 - axis
+    merged.sort(key=lambda r: r[4])
+    return [tuple(r) for r in merged]
+
+"""
+    Returns the blocks to collide with and draw: the static blocks merged together plus the moving blocks untouched.
+    The result keeps the level's object order (a merged block sits where its first piece was) so bounces resolve the same way.
+"""
+def bake_objects(objects,screen=None) -> list:
+    static = []
+    moving = []
+    for i,obj in enumerate(objects):
+        if isinstance(obj.inner,MovingBlock):
+            moving.append((i,obj))
+        else:
+            rect = obj.rect()
+            static.append((rect.x,rect.y,rect.w,rect.h))
+    static_order = [i for i,obj in enumerate(objects) if not isinstance(obj.inner,MovingBlock)]
+
+    baked = []
+    for (x,y,w,h,order) in merge_rects(static):
+        baked.append((static_order[order],Block(screen,StaticBlock(x,y,w,h))))
+    baked.extend(moving)
+    baked.sort(key=lambda entry: entry[0])
+    return [obj for _,obj in baked]
@@ -1,19 +1,22 @@
 import pygame
 from serde import *
 from constants import *
-
-hit_sound = pygame.mixer.Sound("assets/audio/hit.wav")
-hit_sound.set_volume(0.7)
-bounce_sound=pygame.mixer.Sound("assets/audio/collisions.mp3")
-bounce_sound.set_volume(1.5)
-
+import physics
+from physics import EventBus, PhysicsEvent
 
 from debug import is_debug
 
 class Ball:
-    def __init__(self,screen,x,y):
+    def __init__(self,screen,x,y,events:EventBus=None):
         self.screen = screen
+        # sounds (and anything else that cares) subscribe to these instead of the ball playing them itself
+        self.events = events or EventBus()
         self.rect = pygame.Rect(x,y,2*BALL_RADIUS,2*BALL_RADIUS)
+        # where the ball was before the last physics step, so drawing can interpolate between the two
+        self.prev_pos = self.rect.topleft
+        # the rect only holds whole pixels, physics keeps the exact position here (see physics.sync_ball_pos)
+        self.pos = pygame.math.Vector2(self.rect.topleft)
+        self.synced_topleft = self.rect.topleft
         # You may wonder why we represent velocity as a scalar but also have a dir vector component. it just works better this way
         self.dir = pygame.math.Vector2(0,0)
         self.velocity = 0.0 
@@ -22,64 +25,27 @@ class Ball:
 
         self.radius = BALL_RADIUS
 
-    def draw(self):
+    def draw(self,interpolation:float=1.0):
+        x = self.prev_pos[0] + (self.rect.x - self.prev_pos[0]) * interpolation
+        y = self.prev_pos[1] + (self.rect.y - self.prev_pos[1]) * interpolation
         # pygame draws the circle form the center, unlike a rect which it draws from the top left corner. So to avoid a discrepency, we offset the circle by self.radius
-        pygame.draw.circle(self.screen,BALL_COLOR,(self.rect.x+self.radius,self.rect.y+self.radius),self.radius)
+        drawn = pygame.draw.circle(self.screen,BALL_COLOR,(x+self.radius,y+self.radius),self.radius)
 
         # border
-        pygame.draw.circle(self.screen,BLACK,(self.rect.x+self.radius,self.rect.y+self.radius),self.radius,2)
+        drawn = drawn.union(pygame.draw.circle(self.screen,BLACK,(x+self.radius,y+self.radius),self.radius,2))
 
         # debug rect
         if is_debug:
-            pygame.draw.rect(self.screen,BLACK,self.rect,2)
+            drawn = drawn.union(pygame.draw.rect(self.screen,BLACK,self.rect,2))
+        # the area we drew over, for dirty rect updates
+        return drawn
    
     def update(self,objects):
-        # So we predict if the next position where our ball is going to be is gonna collide with something
-        # We create a dummy rectangle to test our predicitions with and assign it the values our actual ball would take if we didnt check for collisions
-        has_collided = False
-
-        for obj in objects:
-            rect = self.rect.copy()
-            rect_x = rect.copy()
-            rect_y = rect.copy()
-            rect_x.x += self.velocity * self.dir.x 
-            rect_y.y += self.velocity * self.dir.y
-
-            # Now, now, theres 4 cases.
-            # 1.Ball collides a block with its top surface touching the block's bottom surface (ball makes contact with an object above it)
-            # 2.Ball collides a block with its bottom surface touching the block's top surface
-            # 3.Ball collides a block with its left surface touching the block's right surface
-            # 4.Ball collides a block with its right surface touching the block's left surface
-
-            # Depending on the situation, we need to change the ball's velocity accordingly.
-            # Example: If the ball touches an object on its right, we change the velocity (or here, the dir)'s x component to be the opposite of that
-            # that is, dir.x = -dir.x
-
-            obj_rect = obj.rect()
-
-            # NOTES FOR DEEK:
-            # add playing sounds INSIDE the if statement if its true
-
-            # check for x-axis collision:
-            if rect_x.colliderect(obj_rect):
-                has_collided = True
-                bounce_sound.play()
-                self.dir.x *= -1
-            # check for y-axis collision
-            if rect_y.colliderect(obj_rect):
-                has_collided = True
-                bounce_sound.play()
-                self.dir.y *= -1
-        self.move()
+        physics.step_ball(self,objects,self.events)
 
     def move(self):
-        self.rect.x += self.velocity  * self.dir.x 
-        self.rect.y += self.velocity * self.dir.y 
+        physics.move_ball(self)
 
-        if abs(self.velocity) > 1:
-            self.velocity -= FRICTION * -1 if self.velocity < 0 else 1
-        else:
-            self.velocity = 0
     def is_moving(self):
         return self.velocity != 0
     
@@ -95,10 +61,11 @@ class Ball:
         dir_ = (initial_pos-final_pos).normalize()
         self.velocity = vel * 0.1
         self.dir = dir_
-        hit_sound.play()
+        self.events.emit(PhysicsEvent.Shot,self)
 
     def from_dict(self,dict_):
         self.rect = rect_from_dict(dict_.get('rect'))
+        self.prev_pos = self.rect.topleft
         self.velocity = dict_.get('velocity') or 0
         self.dir = vector2_from_dict(dict_.get('vector2'))
 
@@ -0,0 +1,360 @@
+"""
+    NumPy batch shot simulator.
+    Simulates a whole array of (angle, power) shots on a level at once, following the same rules as physics.step:
+    the velocity/friction rules of calc_force and apply_friction, and the swept circle bounces of step_ball
+    (earliest hit first, ties going to the block listed first).
+    Used for par calculation and level QA, where stepping one Ball at a time is far too slow.
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from constants import *
+from block import Block, MovingBlock
+from bake import bake_objects
+
+BALL_SIZE = 2*BALL_RADIUS
+# The furthest a ball can travel in a single frame, plus the slack physics.swept_rect adds
+REACH = int(math.ceil(MAX_VELOCITY * 0.1)) + 2
+# Blocks are bucketed into cells of this size so each ball only tests the blocks around it
+CELL_SIZE = 2*BORDER_SIZE
+# Anything the ball can touch during a frame lies within this distance of its top left corner
+MARGIN = BALL_SIZE + REACH
+# Stand-in rect used to pad candidate lists, far away from anything a ball can reach
+FAR_AWAY = -(1 << 30)
+
+@dataclass
+class BatchResult:
+    # (N,2) top left corner of the ball's rect where each shot ended
+    positions: np.ndarray
+    # (N,) whether the ball dropped into the hole
+    holed: np.ndarray
+    # (N,) number of physics steps until the ball stopped or dropped in
+    frames: np.ndarray
+    # (N,2) exact top left of the ball (Ball.pos), which is where the next shot starts from in the game
+    exact: np.ndarray = None
+
+
+def round_half_away(values):
+    # This is what pygame does when a float gets assigned to a Rect coordinate
+    return np.where(values < 0, -np.floor(-values + 0.5), np.floor(values + 0.5))
+
+def overlaps(x,y,w,h,rx,ry,rw,rh):
+    # Same test as pygame.Rect.colliderect, zero sized rects never collide
+    return (x < rx + rw) & (rx < x + w) & (y < ry + rh) & (ry < y + h) & (rw > 0) & (rh > 0)
+
+"""
+    physics.sweep_circle_rect for whole arrays of circles and rects at once (they broadcast together).
+    RETURNS (t,nx,ny), t being inf where there is no hit
+"""
+def sweep_circle_rects(cx,cy,radius,dx,dy,left,top,right,bottom,valid):
+    with np.errstate(divide='ignore',invalid='ignore'):
+        qx = np.minimum(np.maximum(cx,left),right)
+        qy = np.minimum(np.maximum(cy,top),bottom)
+        ox,oy = cx-qx,cy-qy
+        dist2 = ox*ox + oy*oy
+        touching = dist2 <= radius*radius
+
+        dist = np.sqrt(dist2)
+        tnx = np.where(dist2 > 0,ox/dist,0.0)
+        tny = np.where(dist2 > 0,oy/dist,0.0)
+        # center inside the rect, push out through the closest side
+        inside = dist2 <= 0
+        pen = cx-left
+        inx,iny = np.full(np.shape(pen),-1.0),np.zeros(np.shape(pen))
+        for side_pen,snx,sny in ((right-cx,1.0,0.0),(cy-top,0.0,-1.0),(bottom-cy,0.0,1.0)):
+            closer = side_pen < pen
+            inx = np.where(closer,snx,inx)
+            iny = np.where(closer,sny,iny)
+            pen = np.where(closer,side_pen,pen)
+        tnx = np.where(inside,inx,tnx)
+        tny = np.where(inside,iny,tny)
+        touch_hit = touching & (dx*tnx + dy*tny < 0)
+
+        shape = np.broadcast_shapes(np.shape(cx),np.shape(dx),np.shape(left))
+        t_enter,t_exit = np.zeros(shape),np.ones(shape)
+        nx,ny = np.zeros(shape),np.zeros(shape)
+        miss = np.zeros(shape,dtype=bool)
+        for c,d,lo,hi,axis in ((cx,dx,left,right,0),(cy,dy,top,bottom,1)):
+            still = d == 0
+            miss |= still & ((c < lo-radius) | (c > hi+radius))
+            t0,t1 = (lo-radius-c)/d,(hi+radius-c)/d
+            n = np.where(t0 > t1,1.0,-1.0)
+            t0,t1 = np.minimum(t0,t1),np.maximum(t0,t1)
+            later = ~still & (t0 > t_enter)
+            t_enter = np.where(later,t0,t_enter)
+            if axis == 0:
+                nx,ny = np.where(later,n,nx),np.where(later,0.0,ny)
+            else:
+                nx,ny = np.where(later,0.0,nx),np.where(later,n,ny)
+            t_exit = np.where(~still & (t1 < t_exit),t1,t_exit)
+        miss |= t_enter > t_exit
+
+        # round corners
+        px,py = cx + dx*t_enter,cy + dy*t_enter
+        kx = np.where(px < left,left,right)
+        ky = np.where(py < top,top,bottom)
+        corner = ((px < left) | (px > right)) & ((py < top) | (py > bottom))
+        fx,fy = cx-kx,cy-ky
+        a = dx*dx + dy*dy
+        b = 2*(fx*dx + fy*dy)
+        c = fx*fx + fy*fy - radius*radius
+        disc = b*b - 4*a*c
+        tc = (-b - np.sqrt(disc)) / (2*a)
+        corner_hit = (a != 0) & (disc >= 0) & (tc >= 0) & (tc <= 1)
+        hx,hy = cx + dx*tc - kx,cy + dy*tc - ky
+        hdist = np.sqrt(hx*hx + hy*hy)
+
+        face_hit = ~corner & ~((nx == 0) & (ny == 0))
+        sweep_hit = ~miss & np.where(corner,corner_hit,face_hit)
+
+        t = np.where(touching,np.where(touch_hit,0.0,np.inf),np.where(sweep_hit,np.where(corner,tc,t_enter),np.inf))
+        out_nx = np.where(touching,tnx,np.where(corner,hx/hdist,nx))
+        out_ny = np.where(touching,tny,np.where(corner,hy/hdist,ny))
+    t = np.where(valid,t,np.inf)
+    return t,out_nx,out_ny
+
+""" The level's blocks as Level collides with them, static ones merged by bake_objects """
+def load_objects(level_dict) -> list:
+    objs = []
+    for o in level_dict.get('objects') or []:
+        b = Block(None,None)
+        b.from_dict(o)
+        if b.inner is not None:
+            objs.append(b)
+    return bake_objects(objs)
+
+def shots_to_arrays(shots):
+    shots = np.asarray(shots,dtype=np.float64).reshape(-1,2)
+    angles = np.radians(shots[:,0])
+    # same as calc_force: the drag length is capped at MAX_VELOCITY and scaled down
+    velocity = np.minimum(shots[:,1],MAX_VELOCITY) * 0.1
+    velocity[shots[:,1] <= 0] = 0
+    return velocity,np.cos(angles),np.sin(angles)
+
+
+""" Occupancy summed area table plus per cell candidate lists for the static blocks of a level """
+class StaticGeometry:
+    def __init__(self,rects,order,num_objects):
+        self.num_objects = num_objects
+        if len(rects) == 0:
+            self.origin = (0,0)
+            self.sat = np.zeros((1,1),dtype=np.int32)
+            self.cells = np.full((1,1,1),num_objects,dtype=np.int64)
+            return
+
+        x0 = int(rects[:,0].min()) - MARGIN
+        y0 = int(rects[:,1].min()) - MARGIN
+        x1 = int((rects[:,0]+rects[:,2]).max()) + MARGIN
+        y1 = int((rects[:,1]+rects[:,3]).max()) + MARGIN
+        self.origin = (x0,y0)
+
+        occupied = np.zeros((y1-y0,x1-x0),dtype=np.int32)
+        for (x,y,w,h) in rects:
+            occupied[y-y0:y+h-y0,x-x0:x+w-x0] = 1
+        self.sat = np.zeros((y1-y0+1,x1-x0+1),dtype=np.int32)
+        self.sat[1:,1:] = occupied.cumsum(0).cumsum(1)
+
+        cols = (x1-x0) // CELL_SIZE + 1
+        rows = (y1-y0) // CELL_SIZE + 1
+        buckets = [[[] for _ in range(cols)] for _ in range(rows)]
+        for (x,y,w,h),i in zip(rects,order):
+            # cells holding a ball corner from which this rect can be reached within one frame
+            cx0 = max(0,(x - MARGIN - x0) // CELL_SIZE)
+            cy0 = max(0,(y - MARGIN - y0) // CELL_SIZE)
+            cx1 = min(cols-1,(x + w + REACH - x0) // CELL_SIZE)
+            cy1 = min(rows-1,(y + h + REACH - y0) // CELL_SIZE)
+            for cy in range(cy0,cy1+1):
+                for cx in range(cx0,cx1+1):
+                    buckets[cy][cx].append(i)
+        depth = max(1,max(len(b) for row in buckets for b in row))
+        self.cells = np.full((rows,cols,depth),num_objects,dtype=np.int64)
+        for cy,row in enumerate(buckets):
+            for cx,bucket in enumerate(row):
+                self.cells[cy,cx,:len(bucket)] = sorted(bucket)
+
+    """ Whether any static block covers a pixel of [x0,x1) x [y0,y1), vectorized """
+    def any_in_box(self,x0,y0,x1,y1):
+        ox,oy = self.origin
+        h,w = self.sat.shape[0]-1,self.sat.shape[1]-1
+        ax0 = np.clip(x0-ox,0,w).astype(np.int64)
+        ax1 = np.clip(x1-ox,0,w).astype(np.int64)
+        ay0 = np.clip(y0-oy,0,h).astype(np.int64)
+        ay1 = np.clip(y1-oy,0,h).astype(np.int64)
+        sat = self.sat
+        total = sat[ay1,ax1] - sat[ay0,ax1] - sat[ay1,ax0] + sat[ay0,ax0]
+        return total > 0
+
+    """ Indices (in level order) of the static blocks a ball at (x,y) could touch this frame, padded with num_objects """
+    def candidates(self,x,y):
+        ox,oy = self.origin
+        rows,cols,_ = self.cells.shape
+        cx = ((x-ox) // CELL_SIZE).astype(np.int64)
+        cy = ((y-oy) // CELL_SIZE).astype(np.int64)
+        inside = (cx >= 0) & (cx < cols) & (cy >= 0) & (cy < rows)
+        cands = self.cells[np.clip(cy,0,rows-1),np.clip(cx,0,cols-1)]
+        cands[~inside] = self.num_objects
+        return cands
+
+
+""" (frames,len(moving),4) rects of the moving blocks, frame f being what the ball sees on its f-th step """
+def moving_block_rects(objs,moving,start_frame,frames):
+    table = np.zeros((frames,len(moving),4),dtype=np.float64)
+    if len(moving) == 0: return table
+    # stepped on copies, so the same BatchLevel can be simulated again
+    blocks = []
+    for i in moving:
+        b = Block(None,None)
+        b.from_dict(objs[i].to_dict())
+        blocks.append(b)
+    for _ in range(start_frame):
+        for b in blocks: b.update()
+    for f in range(frames):
+        for j,b in enumerate(blocks):
+            r = b.rect()
+            table[f,j] = (r.x,r.y,r.w,r.h)
+        for b in blocks: b.update()
+    return table
+
+
+""" Everything simulate_shots needs from a level dict, built once so a level can be simulated many times without redoing it """
+class BatchLevel:
+    def __init__(self,level_dict):
+        self.ball_start = level_dict.get('ball_start') or (0,0)
+        self.ball_end = level_dict.get('ball_end') or (10,10)
+        self.objs = load_objects(level_dict)
+        self.num_objects = len(self.objs)
+        objs = self.objs
+        self.moving = [i for i,o in enumerate(objs) if isinstance(o.inner,MovingBlock)]
+        static = [i for i,o in enumerate(objs) if not isinstance(o.inner,MovingBlock) and o.rect().w > 0 and o.rect().h > 0]
+        static_rects = np.array([tuple(objs[i].rect()) for i in static],dtype=np.int64).reshape(-1,4)
+        self.geometry = StaticGeometry(static_rects,static,self.num_objects)
+
+        # Rects indexed by level order, with one extra far away row used for padding
+        self.rects = np.zeros((self.num_objects+1,4),dtype=np.float64)
+        self.rects[-1] = (FAR_AWAY,FAR_AWAY,1,1)
+        for i in static:
+            self.rects[i] = tuple(objs[i].rect())
+
+
+"""
+    Simulates every shot from the level's ball_start.
+    `level` is a level dict or a BatchLevel made from one.
+    `shots` is an (N,2) array of (angle in degrees, power). Angles are in screen space (0 points right, 90 points down)
+    and power is the drag length in pixels, capped at MAX_VELOCITY like Ball.calc_force.
+    `start` is one (x,y) for every shot or an (N,2) array with one per shot. It gets rounded like a new Ball's rect,
+    unless `exact_start` is set because it is a BatchResult.exact the shots carry on from.
+    `start_frame` is how many frames the moving blocks have already advanced when the shot is taken.
+"""
+def simulate_shots(level,shots,start=None,start_frame:int=0,max_frames:int=1000,exact_start:bool=False) -> BatchResult:
+    if not isinstance(level,BatchLevel):
+        level = BatchLevel(level)
+    velocity,dir_x,dir_y = shots_to_arrays(shots)
+    n = len(velocity)
+    start = np.asarray(start if start is not None else level.ball_start,dtype=np.float64).reshape(-1,2)
+    end = level.ball_end
+
+    objs = level.objs
+    moving = level.moving
+    geometry = level.geometry
+    # the moving block rows get written every frame
+    rects = level.rects.copy()
+    # Every step removes 1 from the velocity, so no shot lasts longer than this
+    frames_needed = min(max_frames,int(math.ceil(velocity.max(initial=0))) + 2)
+    moving_rects = moving_block_rects(objs,moving,start_frame,frames_needed)
+    moving_idx = np.array(moving,dtype=np.int64)
+
+    radius = BALL_SIZE / 2
+    # exact top left of the ball, the rect is this rounded (see physics.set_ball_pos)
+    if not exact_start:
+        start = round_half_away(start)
+    x = np.broadcast_to(start[:,0],(n,)).copy()
+    y = np.broadcast_to(start[:,1],(n,)).copy()
+    holed = np.zeros(n,dtype=bool)
+    frames = np.zeros(n,dtype=np.int64)
+    running = np.ones(n,dtype=bool)
+
+    for frame in range(max_frames):
+        rect_x,rect_y = round_half_away(x),round_half_away(y)
+        in_hole = running & overlaps(rect_x,rect_y,BALL_SIZE,BALL_SIZE,end[0],end[1],HOLE_RADIUS,HOLE_RADIUS)
+        holed |= in_hole
+        running &= ~in_hole & (velocity != 0)
+        idx = np.nonzero(running)[0]
+        if len(idx) == 0: break
+        frames[idx] += 1
+
+        vi = velocity[idx]
+        dxi,dyi = dir_x[idx],dir_y[idx]
+        cx,cy = x[idx] + radius,y[idx] + radius
+
+        # same area as physics.swept_rect
+        reach = np.floor(np.abs(vi)) + 2
+        bx0,by0 = rect_x[idx] - reach,rect_y[idx] - reach
+        bx1,by1 = rect_x[idx] + BALL_SIZE + reach,rect_y[idx] + BALL_SIZE + reach
+        near = geometry.any_in_box(bx0,by0,bx1,by1)
+        if len(moving):
+            rects[moving_idx] = moving_rects[min(frame,frames_needed-1)]
+            mr = rects[moving_idx]
+            near |= overlaps(bx0[:,None],by0[:,None],(bx1-bx0)[:,None],(by1-by0)[:,None],mr[:,0],mr[:,1],mr[:,2],mr[:,3]).any(axis=1)
+
+        # nothing around, the ball just rolls
+        free = ~near
+        cx[free] += dxi[free]*vi[free]
+        cy[free] += dyi[free]*vi[free]
+
+        k = np.nonzero(near)[0]
+        if len(k):
+            cands = geometry.candidates(x[idx][k],y[idx][k])
+            if len(moving):
+                cands = np.sort(np.concatenate([cands,np.broadcast_to(moving_idx,(len(k),len(moving_idx)))],axis=1),axis=1)
+            r = rects[cands]
+            # keep only the blocks inside the reach of each ball (still in level order), usually a handful out of the whole cell list
+            reachable = overlaps(bx0[k,None],by0[k,None],(bx1-bx0)[k,None],(by1-by0)[k,None],r[...,0],r[...,1],r[...,2],r[...,3])
+            width = max(1,int(reachable.sum(axis=1).max()))
+            keep = np.argsort(~reachable,axis=1,kind='stable')[:,:width]
+            r = np.take_along_axis(r,keep[...,None],axis=1)
+            left,top = r[...,0],r[...,1]
+            right,bottom = left + r[...,2],top + r[...,3]
+            valid = np.take_along_axis(reachable,keep,axis=1)
+
+            ckx,cky = cx[k],cy[k]
+            dkx,dky = dxi[k],dyi[k]
+            remaining = vi[k].copy()
+            active = np.ones(len(k),dtype=bool)
+            # same loop as physics.step_ball, one bounce per pass for every ball still moving
+            for _ in range(MAX_BOUNCES_PER_STEP + 1):
+                a = np.nonzero(active)[0]
+                if len(a) == 0: break
+                mx,my = dkx[a]*remaining[a],dky[a]*remaining[a]
+                t,nx,ny = sweep_circle_rects(ckx[a,None],cky[a,None],radius,mx[:,None],my[:,None],left[a],top[a],right[a],bottom[a],valid[a])
+                best = np.argmin(t,axis=1)
+                rows = np.arange(len(a))
+                tb = t[rows,best]
+                hit = np.isfinite(tb)
+
+                rolls = a[~hit]
+                ckx[rolls] += mx[~hit]
+                cky[rolls] += my[~hit]
+                active[rolls] = False
+
+                h = a[hit]
+                tb,nxb,nyb = tb[hit],nx[rows,best][hit],ny[rows,best][hit]
+                ckx[h] += mx[hit]*tb
+                cky[h] += my[hit]*tb
+                dot = dkx[h]*nxb + dky[h]*nyb
+                dkx[h] -= 2*dot*nxb
+                dky[h] -= 2*dot*nyb
+                remaining[h] *= (1-tb)
+
+            cx[k],cy[k] = ckx,cky
+            dxi[k],dyi[k] = dkx,dky
+            dir_x[idx],dir_y[idx] = dxi,dyi
+
+        x[idx] = cx - radius
+        y[idx] = cy - radius
+        velocity[idx] = np.where(np.abs(vi) > 1,vi - 1,0)
+
+    positions = np.stack([round_half_away(x),round_half_away(y)],axis=1).astype(np.int64)
+    return BatchResult(positions,holed,frames,np.stack([x,y],axis=1))
@@ -0,0 +1,251 @@
+"""
+    Headless benchmarks for the hot paths: ball physics, level frames, menu drawing and level (de)serialization.
+    Runs under SDL's dummy video and audio drivers, so it works on a machine without a display or sound card.
+
+        python benchmark.py --out results.json                       run everything and save the results
+        python benchmark.py --baseline results.json                  run again and compare against a saved run
+        python benchmark.py --filter level_frame --quick             only some benchmarks, fewer samples
+
+    Results are JSON: {"meta": {...}, "results": {name: {"median_us", "mean_us", "min_us", "max_us", "number", "repeat"}}}.
+    With --baseline every benchmark whose median got slower by more than --threshold is reported and the exit code is 1.
+"""
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+
+import sys
+import json
+import math
+import time
+import platform
+import statistics
+
+import pygame
+
+from constants import *
+import runtime
+import main
+import main_menu
+import physics
+from level import Level
+from renderer import GameplayRenderer
+from catalog import LevelCatalog
+from serde import level_dict_to_binary, BinaryLevel
+
+BLOCK_COUNTS = [10,100,1000,10000]
+# a sample has to take at least this long, short benchmarks get called several times per sample
+MIN_SAMPLE_TIME = 0.02
+
+
+"""
+    Times `fn` (no arguments). Picks how many calls go into one sample so a sample takes at least MIN_SAMPLE_TIME,
+    then takes `repeat` samples. RETURNS the stats per call, in microseconds
+"""
+def measure(fn,repeat:int=7) -> dict:
+    number = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= MIN_SAMPLE_TIME or number >= 1_000_000: break
+        number *= 2 if elapsed == 0 else max(2,min(10,math.ceil(MIN_SAMPLE_TIME/elapsed)))
+
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t) / number * 1e6)
+    return {
+        'median_us':statistics.median(samples),
+        'mean_us':statistics.fmean(samples),
+        'min_us':min(samples),
+        'max_us':max(samples),
+        'number':number,
+        'repeat':repeat,
+    }
+
+
+""" A level dict with `n` small blocks spread in a grid over the play area, with gaps so baking cant merge them """
+def synthetic_level_dict(n:int) -> dict:
+    inner_w,inner_h = SCREEN_W - 2*BORDER_SIZE,SCREEN_H - 2*BORDER_SIZE
+    cols = max(1,math.ceil(math.sqrt(n * inner_w / inner_h)))
+    rows = max(1,math.ceil(n / cols))
+    step = max(2,min(inner_w // cols,inner_h // rows))
+    size = max(1,step // 2)
+    objects = []
+    for i in range(n):
+        x = BORDER_SIZE + (i % cols) * step
+        y = BORDER_SIZE + (i // cols) * step
+        objects.append({'inner':{'rect':{'x':x,'y':y,'w':size,'h':size}}})
+    borders = [(0,0,SCREEN_W,BORDER_SIZE),(0,SCREEN_H-BORDER_SIZE,SCREEN_W,BORDER_SIZE),(0,0,BORDER_SIZE,SCREEN_H),(SCREEN_W-BORDER_SIZE,0,BORDER_SIZE,SCREEN_H)]
+    for x,y,w,h in borders:
+        objects.append({'inner':{'rect':{'x':x,'y':y,'w':w,'h':h}}})
+    return {'ball_start':[SCREEN_W//2,SCREEN_H//2],'ball_end':[BORDER_SIZE+5,BORDER_SIZE+5],'objects':objects}
+
+def shipped_level_dicts() -> list:
+    catalog = LevelCatalog(LEVELS_PATH)
+    levels = []
+    for i in range(catalog.count()):
+        contents = catalog.get(i)
+        if contents is None: continue
+        if isinstance(contents,BinaryLevel):
+            contents = contents.to_dict()
+        levels.append((catalog.entry(i).file_name,contents))
+    if not levels:
+        raise RuntimeError('no levels found in {}'.format(os.path.abspath(LEVELS_PATH)))
+    return levels
+
+def make_level(level_dict) -> Level:
+    level = Level(runtime.SCREEN,(0,0),(0,0),[])
+    level.from_dict(level_dict)
+    return level
+
+# the same shot every time a benchmark needs the ball moving
+SHOT = ((0,0),(-400,-260))
+
+def keep_ball_moving(level):
+    if not level.ball.is_moving():
+        physics.set_ball_pos(level.ball,level.ball_start[0],level.ball_start[1])
+        level.ball.calc_force(*SHOT)
+
+
+def bench_ball_update(results,repeat):
+    for n in BLOCK_COUNTS:
+        level = make_level(synthetic_level_dict(n))
+        ball = level.ball
+        objects = level.baked_objects
+        start = level.ball_start
+        def shoot():
+            physics.set_ball_pos(ball,start[0],start[1])
+            ball.calc_force(*SHOT)
+        # every block, the way Ball.update checks them
+        def update():
+            shoot()
+            ball.update(objects)
+        results['ball_update/{}_blocks'.format(n)] = measure(update,repeat)
+        # only the blocks the level's broadphase grid hands back
+        def update_grid():
+            shoot()
+            physics.step_ball(ball,objects,None,level.grid)
+        results['ball_update_grid/{}_blocks'.format(n)] = measure(update_grid,repeat)
+
+def bench_level_frames(results,repeat):
+    levels = [('shipped/'+name,d) for name,d in shipped_level_dicts()]
+    levels += [('synthetic/{}_blocks'.format(n),synthetic_level_dict(n)) for n in BLOCK_COUNTS]
+    for name,level_dict in levels:
+        level = make_level(level_dict)
+        def frame():
+            keep_ball_moving(level)
+            level.update()
+            runtime.SCREEN.fill(BG_COLOR)
+            level.draw()
+        results['level_frame/'+name] = measure(frame,repeat)
+        renderer = GameplayRenderer(level,runtime.SCREEN)
+        def frame_dirty():
+            keep_ball_moving(level)
+            level.update()
+            renderer.draw()
+        results['level_frame_dirty/'+name] = measure(frame_dirty,repeat)
+
+def bench_menus(results,repeat):
+    mouse = (SCREEN_W//2,SCREEN_H//2)
+    hover = {"play": 0.0, "editor": 0.0, "settings": 0.0}
+    settings = {"music": True, "sfx": True}
+    settings_anim = {"music": 0.0, "sfx": 0.0}
+    results['menu/draw_main_menu_with_intro'] = measure(lambda: main_menu.draw_main_menu_with_intro(mouse,0.5,hover),repeat)
+    results['menu/draw_main_menu_normal'] = measure(lambda: main_menu.draw_main_menu_normal(mouse,hover),repeat)
+    results['menu/draw_settings_menu'] = measure(lambda: main_menu.draw_settings_menu(mouse,settings_anim,settings),repeat)
+    results['menu/draw_level_selector'] = measure(lambda: main_menu.draw_level_selector(mouse,hover),repeat)
+
+def bench_serde(results,repeat):
+    levels = shipped_level_dicts()
+    levels += [('synthetic/{}_blocks'.format(n),synthetic_level_dict(n)) for n in BLOCK_COUNTS]
+    for name,level_dict in levels:
+        level = make_level(level_dict)
+        def round_trip():
+            level.from_dict(level.to_dict())
+        results['serde_round_trip/'+name] = measure(round_trip,repeat)
+        data = level_dict_to_binary(level_dict)
+        results['serde_from_binary/'+name] = measure(lambda: level.from_binary(BinaryLevel(data)),repeat)
+
+BENCHMARKS = [
+    ('ball_update',bench_ball_update),
+    ('level_frame',bench_level_frames),
+    ('menu',bench_menus),
+    ('serde',bench_serde),
+]
+
+
+""" Runs the benchmarks whose name contains `filter_` (all of them without one). RETURNS the report """
+def run(filter_:str=None,repeat:int=7) -> dict:
+    main.init()
+    groups = BENCHMARKS
+    if filter_:
+        # skip whole groups when the filter names one, otherwise run them all and just keep the matching results
+        groups = [(group,bench) for group,bench in BENCHMARKS if filter_.startswith(group)] or BENCHMARKS
+    results = {}
+    for group,bench in groups:
+        group_results = {}
+        bench(group_results,repeat)
+        for name,stats in group_results.items():
+            if filter_ and filter_ not in name: continue
+            results[name] = stats
+            print('{:<48} {:>12.1f} us'.format(name,stats['median_us']))
+    return {
+        'meta':{
+            'time':time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python':platform.python_version(),
+            'pygame':pygame.version.ver,
+            'platform':platform.platform(),
+        },
+        'results':results,
+    }
+
+"""
+    Compares two runs by median time. RETURNS [(name, baseline us, current us, ratio)] for every benchmark slower than
+    the baseline by more than `threshold` (0.1 = 10%)
+"""
+def compare(current:dict,baseline:dict,threshold:float=0.1) -> list:
+    regressions = []
+    base = baseline.get('results',{})
+    for name,stats in current.get('results',{}).items():
+        old = base.get(name)
+        if old is None or old['median_us'] <= 0: continue
+        ratio = stats['median_us'] / old['median_us']
+        if ratio > 1 + threshold:
+            regressions.append((name,old['median_us'],stats['median_us'],ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Headless benchmarks for physics, rendering and serde')
+    parser.add_argument('--out',help='write the results to this JSON file')
+    parser.add_argument('--baseline',help='compare against the results in this JSON file')
+    parser.add_argument('--threshold',type=float,default=0.1,help='how much slower (0.1 = 10%%) counts as a regression')
+    parser.add_argument('--filter',help='only run benchmarks whose name contains this')
+    parser.add_argument('--quick',action='store_true',help='fewer samples per benchmark')
+    args = parser.parse_args()
+    if args.out: args.out = os.path.abspath(args.out)
+    if args.baseline: args.baseline = os.path.abspath(args.baseline)
+    # levels, images and fonts are looked up relative to the game directory (LEVELS_PATH, BACKGROUND_IMAGE),
+    # so run from there wherever this gets started from. They are only read once the benchmarks run
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    report = run(args.filter,3 if args.quick else 7)
+    if args.out:
+        with open(args.out,'w') as f:
+            json.dump(report,f,indent=2)
+    if args.baseline:
+        with open(args.baseline,'r') as f:
+            baseline = json.load(f)
+        regressions = compare(report,baseline,args.threshold)
+        for name,old,new,ratio in regressions:
+            print('REGRESSION {:<40} {:>10.1f} us -> {:>10.1f} us ({:+.0f}%)'.format(name,old,new,(ratio-1)*100))
+        if regressions:
+            sys.exit(1)
+        print('no regressions against',args.baseline)
+    pygame.quit()
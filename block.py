@@ -6,8 +6,8 @@ class StaticBlock:
     def __init__(self,x,y,w,h):
         self.rect = pygame.Rect(x,y,w,h)
         
-    def draw(self,screen):
-        pygame.draw.rect(screen,BLOCK_COLOR,self.rect)
+    def draw(self,screen,interpolation:float=1.0):
+        return pygame.draw.rect(screen,BLOCK_COLOR,self.rect)
 
     def update(self):
         # do nothing
@@ -27,11 +27,16 @@ class MovingBlock:
         self.checkpoints = checkpoints 
         self.current_checkpoint = 0
         self.speed = speed
+        # where the block was before the last update, so drawing can interpolate between the two
+        self.prev_pos = self.rect.topleft
 
-    def draw(self,screen):
-        pygame.draw.rect(screen,BLOCK_COLOR,self.rect)
+    def draw(self,screen,interpolation:float=1.0):
+        x = self.prev_pos[0] + (self.rect.x - self.prev_pos[0]) * interpolation
+        y = self.prev_pos[1] + (self.rect.y - self.prev_pos[1]) * interpolation
+        return pygame.draw.rect(screen,BLOCK_COLOR,(x,y,self.rect.w,self.rect.h))
 
     def update(self):
+        self.prev_pos = self.rect.topleft
         if len(self.checkpoints) == 0: return
         to = self.checkpoints[self.current_checkpoint]
         rect_v = pygame.math.Vector2(self.rect.x,self.rect.y)
@@ -44,6 +49,7 @@ class MovingBlock:
 
     def from_dict(self,dict_):
         self.rect = rect_from_dict(dict_.get('rect'))
+        self.prev_pos = self.rect.topleft
         self.current_checkpoint = dict_.get('current_checkpoint') or 0
         self.speed = dict_.get('speed') or 0
         self.checkpoints = [vector2_from_dict(d) for d in dict_.get('checkpoints') or [] ]
@@ -66,8 +72,8 @@ class Block:
         if hasattr(self.inner,'update') or callable(self.inner,'update'):
             self.inner.update()
 
-    def draw(self):
-        self.inner.draw(self.screen)
+    def draw(self,interpolation:float=1.0):
+        return self.inner.draw(self.screen,interpolation)
 
     def from_dict(self,dict_):
         if dict_.get('inner') is None:return
@@ -0,0 +1,172 @@
+"""
+    Level catalog.
+    Keeps a lightweight manifest of the level files under LEVELS_PATH (file name, level number, mtime, size) so menus can ask
+    how many levels there are, or for level n, without going to the disk every frame. The directory is scanned once, and a level body
+    is only read and parsed the first time someone plays it. Files are read again when their mtime or size changes.
+    If there is a level pack at LEVEL_PACK_PATH the levels come from it instead (see levelpack.py).
+"""
+
+import os
+import stat
+
+from constants import *
+from serde import LEVEL_MAGIC, load_binary_level, parse_level
+
+
+class LevelEntry:
+    def __init__(self,file_name,path,mtime,size):
+        self.file_name = file_name
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        # 1 based, set by the catalog from where the file sorts
+        self.level_num = None
+        # the parsed level: a dict for JSON files, a serde.BinaryLevel for binary ones
+        self.contents = None
+        # why the file couldnt be loaded, if it couldnt
+        self.error = None
+
+    def read_bytes(self) -> bytes:
+        with open(self.path,'rb') as file:
+            return file.read()
+
+    """
+        The parsed level, read and cached on first use. JSON files give a level dict, binary files a memory mapped serde.BinaryLevel.
+        RETURNS None if the file is unreadable or not a valid level, see self.error
+    """
+    def load(self):
+        if self.contents is not None or self.error is not None:
+            return self.contents
+        try:
+            self.contents = load_level_file(self.path)
+        except (OSError,ValueError) as e:
+            self.error = str(e)
+            print('Could not load level {}: {}'.format(self.path,self.error))
+        return self.contents
+
+
+""" A level inside a level pack. The size comes from the pack's index, the body is a slice of the mapped pack """
+class PackLevelEntry(LevelEntry):
+    def __init__(self,pack,index_entry):
+        super().__init__('{}:{}'.format(os.path.basename(pack.path),index_entry.level_id),pack.path,None,index_entry.length)
+        self.pack = pack
+        self.index_entry = index_entry
+
+    def read_bytes(self) -> bytes:
+        return bytes(self.pack.blob(self.index_entry))
+
+    def load(self):
+        if self.contents is not None or self.error is not None:
+            return self.contents
+        try:
+            if not self.pack.verify(self.index_entry):
+                raise ValueError('level does not match its hash in the pack index')
+            self.contents = parse_level(self.pack.blob(self.index_entry))
+        except ValueError as e:
+            self.error = str(e)
+            print('Could not load level {}: {}'.format(self.file_name,self.error))
+        return self.contents
+
+
+"""
+    Reads a level file in either format. RETURNS a level dict (JSON) or a serde.BinaryLevel (binary, memory mapped).
+    Raises OSError or ValueError if it isnt a level
+"""
+def load_level_file(path):
+    with open(path,'rb') as file:
+        head = file.read(len(LEVEL_MAGIC))
+        if head == LEVEL_MAGIC:
+            return load_binary_level(path)
+        return parse_level(head + file.read())
+
+
+class LevelCatalog:
+    def __init__(self,path:str=LEVELS_PATH,pack_path:str=None):
+        self.path = path
+        self.pack_path = pack_path
+        # (mtime,size) of the pack the entries came from, None when they came from the directory
+        self.pack_stat = None
+        # in the order levels are numbered
+        self.entries = []
+        self.by_name = {}
+        self.scanned = False
+
+    """
+        Scans the directory (or re-reads the pack index) again, which only stats the files. Files whose mtime and size are the same
+        as last time keep what we already read from them. Call this when the level list might have changed on disk (opening the level selector), not every frame
+    """
+    def refresh(self):
+        entries = self.scan_pack()
+        if entries is None:
+            entries = self.scan_dir()
+        for i,entry in enumerate(entries):
+            entry.level_num = i+1
+        self.entries = entries
+        self.by_name = {entry.file_name:entry for entry in entries}
+        self.scanned = True
+
+    def scan_dir(self) -> list:
+        self.pack_stat = None
+        entries = []
+        if not os.path.isdir(self.path): return entries
+        for file_name in sorted(os.listdir(self.path)):
+            path = os.path.join(self.path,file_name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            # skip __pycache__ and anything else that isnt a level file
+            if not stat.S_ISREG(st.st_mode): continue
+            old = self.by_name.get(file_name)
+            if old is not None and old.mtime == st.st_mtime_ns and old.size == st.st_size:
+                entries.append(old)
+            else:
+                entries.append(LevelEntry(file_name,path,st.st_mtime_ns,st.st_size))
+        return entries
+
+    """ Entries for every level in the pack, in level id order. RETURNS None if there is no (usable) pack """
+    def scan_pack(self):
+        if not self.pack_path: return None
+        try:
+            st = os.stat(self.pack_path)
+        except OSError:
+            return None
+        pack_stat = (st.st_mtime_ns,st.st_size)
+        if pack_stat == self.pack_stat:
+            return self.entries
+        from levelpack import LevelPack
+        try:
+            pack = LevelPack(self.pack_path)
+        except (OSError,ValueError) as e:
+            print('Could not open level pack {}: {}'.format(self.pack_path,e))
+            return None
+        self.pack_stat = pack_stat
+        return [PackLevelEntry(pack,index_entry) for index_entry in pack.entries]
+
+    def ensure_scanned(self):
+        if not self.scanned:
+            self.refresh()
+
+    def count(self) -> int:
+        self.ensure_scanned()
+        return len(self.entries)
+
+    def __len__(self):
+        return self.count()
+
+    """ The entry for the level at `index` (0 based) """
+    def entry(self,index:int) -> LevelEntry:
+        self.ensure_scanned()
+        return self.entries[index]
+
+    def entry_by_name(self,file_name:str) -> LevelEntry:
+        self.ensure_scanned()
+        return self.by_name.get(file_name)
+
+    """ The parsed level at `index` (0 based, see LevelEntry.load), or None if that file is broken """
+    def get(self,index:int) -> dict:
+        return self.entry(index).load()
+
+
+# Shared by every menu, scanned the first time something asks for it
+LEVEL_CATALOG = LevelCatalog(LEVELS_PATH,LEVEL_PACK_PATH)
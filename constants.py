@@ -33,8 +33,41 @@ HOLE_COLOR = BLACK
 
 FRICTION = 0.01
 MAX_VELOCITY = 500 
+# How many surfaces the ball can bounce off within a single physics step (corners need 2)
+MAX_BOUNCES_PER_STEP = 4
 
+""" Physics runs at a fixed rate of one step every STEP_BY seconds, however fast frames are rendered """
 STEP_BY = 1/FPS
+# When a frame takes too long we only catch up this many steps and drop the rest, instead of falling further and further behind
+MAX_STEPS_PER_FRAME = 5
+# Frame times longer than this (window dragged, breakpoint hit etc.) are clamped
+MAX_FRAME_TIME = 0.25
+# How often we draw, this does not change how fast the game plays
+RENDER_FPS = FPS
+# Turbo: while space is held, or always with main.py --turbo, a moving ball is stepped
+# for up to TURBO_FRAME_BUDGET seconds per frame instead of once every STEP_BY, and only where it got to is drawn
+TURBO_FRAME_BUDGET = 0.008
+
+# Trajectory preview while aiming (preview.py): how many bounces it shows, how much of a frame it may spend and
+# how finely angle (degrees) and power (pixels of drag) are quantized for its cache
+PREVIEW_BOUNCES = 3
+PREVIEW_FRAME_BUDGET = 0.002
+PREVIEW_MAX_STEPS = 600
+PREVIEW_ANGLE_STEP = 0.5
+PREVIEW_POWER_STEP = 2
+PREVIEW_CACHE_SIZE = 256
+PREVIEW_COLOR = 255,255,255
+
+# Par solver (solver.py): the shot grid tried from every position, positions kept per stroke, how close two positions have to be
+# to count as the same, and how many holing shots the last stroke needs before par is the minimum instead of one more
+SOLVER_ANGLES = 72
+SOLVER_POWERS = 8
+SOLVER_BEAM_WIDTH = 32
+SOLVER_MAX_STROKES = 6
+SOLVER_EPSILON = 4.0
+SOLVER_EASY_SHOTS = 3
+# shots below this many per task arent worth sending to another process
+SOLVER_MIN_TASK = 2048
 
 
 # UI Constants
@@ -42,6 +75,8 @@ BACKGROUND_IMAGE = './assets/iamge.png'
 MUSIC_ICON_PATH = './assets/icon_music.png'
 SFX_ICON_PATH = './assets/icon_sfx.png'
 LEVELS_PATH = './levels/'
+# When this file exists the levels are read from it instead of LEVELS_PATH, build it with levelpack.py
+LEVEL_PACK_PATH = './levels.pack'
 CUSTOM_FONT_FILENAMES = ["game_font.ttf", "pixel_font.ttf", "arcade_font.ttf"]
 INTRO_DURATION = 3
 BUTTON_STAGGER = [1,1.5, 2]
@@ -50,6 +85,23 @@ ICON_SIZE = (40, 40)   # requested tiny icon size
 MAX_ZOOM = 1.06  # or 1.10 if you want more zoom
 MIN_ZOOM = 1.00
 current_zoom = MIN_ZOOM
+# Background zoom levels closer than this reuse the same scaled image
+ZOOM_QUANTUM = 0.005
+# How many scaled backgrounds we keep around (each one is about a screen's worth of memory)
+BG_CACHE_SIZE = 12
+# The intro zoom wobbles between these, we pre-render it as INTRO_ZOOM_FRAMES frames instead of rescaling every frame
+INTRO_ZOOM_MIN, INTRO_ZOOM_MAX = 0.97, 1.13
+INTRO_ZOOM_FRAMES = 9
+# How many rendered strings textcache.render_text keeps around
+TEXT_CACHE_SIZE = 256
+# The debug frame profiler overlay keeps stats over this many frames, and redraws its text every PROFILER_TEXT_REFRESH frames
+PROFILER_WINDOW = 240
+PROFILER_TEXT_REFRESH = 15
+
+# Trace recorder (tracing.py): events kept in memory before the writer thread catches up, how often it writes, and how many it formats in one go
+TRACE_BUFFER_SIZE = 200_000
+TRACE_FLUSH_INTERVAL = 0.5
+TRACE_FLUSH_CHUNK = 512
 
 # UI geometry
 BUTTON_W, BUTTON_H = 380, 84
@@ -67,21 +119,7 @@ MOUSE_BUTTON_ONE = 1
 HOVER_SPEED = 8.0
 
 
-def load_levels_dict():
-    import os
-    import json
-    if not os.path.exists(LEVELS_PATH): return []
-    levels = []
-    files = os.listdir(LEVELS_PATH)
-    for file_name in sorted(files):
-        with open(LEVELS_PATH+'/'+file_name,'r') as file:
-            conts = file.read()
-            contents = json.loads(conts)
-            levels.append(contents)
-
-    return levels
-    
-LEVELS_DICTS = load_levels_dict()
+# The level files under LEVELS_PATH are tracked by catalog.LEVEL_CATALOG
 
 
 # Editor UI Constants
@@ -3,6 +3,7 @@
 """
 
 import math
+from collections import Counter
 from dataclasses import dataclass
 
 from enum import Enum
@@ -13,9 +14,8 @@ from constants import *
 import ui_misc
 import level
 import block
+from spatial import UniformGrid
 
-pygame.init()
-pygame.font.init()
 
 PLAY_SCREEN_W = SCREEN_W
 PLAY_SCREEN_H = SCREEN_H
@@ -56,6 +56,55 @@ class Object:
             case ObjType.BallStart:
                 pygame.draw.circle(screen,BALL_COLOR,(self.rect.x+BALL_RADIUS,self.rect.y+BALL_RADIUS),BALL_RADIUS)
         
+"""
+    The editor's objects, in the order they were placed, plus a grid of SNAP_BY cells over them and a count per ObjType,
+    so placing, erasing and hovering only look at the objects around the cursor instead of all of them.
+    Everything that adds or removes objects has to go through append/remove/pop to keep the three in sync
+"""
+class EditorObjects:
+    def __init__(self,objs=()):
+        # object -> None, a dict keeps insertion order and removes in O(1)
+        self.objs = {}
+        self.grid = UniformGrid(SNAP_BY)
+        self.counts = Counter()
+        for obj in objs:
+            self.append(obj)
+
+    def append(self,obj):
+        self.objs[obj] = None
+        self.grid.insert(obj,obj.rect)
+        self.counts[obj.type] += 1
+
+    def remove(self,obj):
+        del self.objs[obj]
+        self.grid.remove(obj)
+        self.counts[obj.type] -= 1
+
+    """ Removes and RETURNS the object placed last """
+    def pop(self):
+        obj = self.last()
+        self.remove(obj)
+        return obj
+
+    def last(self):
+        return next(reversed(self.objs))
+
+    def count(self,ty:ObjType) -> int:
+        return self.counts[ty]
+
+    """ RETURNS the first object (in placement order) overlapping `rect`, only editable ones if `editable`, or None """
+    def first_colliding(self,rect,editable:bool=False):
+        for obj in self.grid.query(rect):
+            if rect.colliderect(obj.rect) and (obj.editable or not editable):
+                return obj
+        return None
+
+    def __iter__(self):
+        return iter(self.objs)
+
+    def __len__(self):
+        return len(self.objs)
+
 class ToolType(Enum):
     Object = 1,
     Eraser = 2
@@ -90,15 +139,11 @@ class Tool():
         rect = self.rect
         if rect.x > PLAY_SCREEN_W:
             is_ok = False
-        for obj in objs:
-            if rect.colliderect(obj.rect):
-                is_ok = False
-                break
+        elif objs.first_colliding(rect) is not None:
+            is_ok = False
         if self.type == ToolType.Object and (self.obj_type == ObjType.Hole or self.obj_type == ObjType.BallStart):
-            for obj in objs:
-                if obj.type == self.obj_type:
-                    is_ok = False
-                    break
+            if objs.count(self.obj_type) > 0:
+                is_ok = False
             
         self.is_ok = is_ok
         
@@ -130,26 +175,24 @@ class Tool():
         objects.append(obj)
 
     def use_eraser(self,objects):
-        rect = self.rect
-        for (i,obj) in enumerate(objects):
-            if obj.rect.colliderect(rect) and obj.editable:
-                objects.pop(i)
-                break
+        obj = objects.first_colliding(self.rect,editable=True)
+        if obj is not None:
+            objects.remove(obj)
     def draw_preview(self,screen,objs):
         if self.type == ToolType.Eraser:
             rect = self.rect
-            for obj in objs:
-                if rect.colliderect(obj.rect):
-                    match obj.type:
-                        case ObjType.StaticBlock | ObjType.MovingBlock:
-                            pygame.draw.rect(screen,BLACK,obj.rect,7)
-                        case ObjType.Hole:
-                            pygame.draw.circle(screen,BLACK,(rect.x,rect.y),HOLE_RADIUS,5)
-                            
-                        case ObjType.BallStart:
-                            pygame.draw.circle(screen,BLACK,(rect.x+BALL_RADIUS,rect.y+BALL_RADIUS),BALL_RADIUS,5)
-
-                    return
+            obj = objs.first_colliding(rect)
+            if obj is not None:
+                match obj.type:
+                    case ObjType.StaticBlock | ObjType.MovingBlock:
+                        pygame.draw.rect(screen,BLACK,obj.rect,7)
+                    case ObjType.Hole:
+                        pygame.draw.circle(screen,BLACK,(rect.x,rect.y),HOLE_RADIUS,5)
+                        
+                    case ObjType.BallStart:
+                        pygame.draw.circle(screen,BLACK,(rect.x+BALL_RADIUS,rect.y+BALL_RADIUS),BALL_RADIUS,5)
+
+                return
             pygame.draw.rect(screen,BLACK,(rect.x,rect.y,SNAP_BY,SNAP_BY),5)
 
             return 
@@ -209,7 +252,7 @@ class UIButton:
 class Editor:
     def __init__(self,screen):
         self.screen = screen
-        self.objects = create_borders()
+        self.objects = EditorObjects(create_borders())
         self.tool = Tool(ToolType.Object,ObjType.StaticBlock)
         self.redo_buf = []
 
@@ -353,18 +396,10 @@ class Editor:
         return level.Level(None,ball_start,ball_end,objs) 
 
     def validate_level(self) -> bool:
-        valid_start,valid_end = False,False
-        for v in self.objects:
-            if v.type == ObjType.Hole:
-                if valid_end: valid_end = False; break 
-                valid_end = True
-            if v.type == ObjType.BallStart:
-                if valid_start: valid_start = False; break 
-                valid_start = True
-        return valid_start and valid_end
+        return self.objects.count(ObjType.BallStart) == 1 and self.objects.count(ObjType.Hole) == 1
 
     def undo(self):
-        if not self.objects[-1].editable: return 
+        if not self.objects.last().editable: return 
         self.redo_buf.append(self.objects.pop())
 
     def redo(self):
@@ -373,6 +408,7 @@ class Editor:
 
 
 def main():
+    pygame.init()
     screen = pygame.display.set_mode((SCREEN_W,SCREEN_H))
     clock = pygame.time.Clock()
     running = True
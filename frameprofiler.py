@@ -0,0 +1,127 @@
+"""
+    In-game frame profiler, shown as an overlay when debug.is_debug is on.
+    Every frame is split into phases (events, App.update, App.draw, flip), and the game counts how many objects of each type it
+    updated and drew. The overlay shows rolling frame time stats, the last frame's phase breakdown and counts, and a frame time graph.
+"""
+
+import time
+from collections import deque, Counter
+
+import pygame
+
+from constants import *
+
+# The profiler the game reports object counts to, None while profiling is off
+active = None
+
+""" Counts `n` objects of type `kind` (e.g. 'Ball') as having had `what` ('update' or 'draw') done to them this frame """
+def count(kind:str,what:str,n:int=1):
+    if active is not None:
+        active.counts[(kind,what)] += n
+
+""" Same as count for every (kind,n) in `kinds`, a Counter of object types """
+def count_all(kinds,what:str):
+    if active is not None:
+        for kind,n in kinds.items():
+            active.counts[(kind,what)] += n
+
+
+def percentile(sorted_values,p:float):
+    if not sorted_values: return 0.0
+    i = min(len(sorted_values)-1,max(0,round(p/100 * (len(sorted_values)-1))))
+    return sorted_values[i]
+
+
+class FrameProfiler:
+    PHASES = ('events','update','draw','flip')
+
+    def __init__(self,window:int=PROFILER_WINDOW):
+        # frame times in seconds, the last `window` frames
+        self.frame_times = deque(maxlen=window)
+        self.phase_times = {}
+        self.counts = Counter()
+        # what the last finished frame did, this is what gets shown
+        self.last_phase_times = {}
+        self.last_counts = Counter()
+        self.frame_start = None
+        self.lap_start = None
+        self.frames_since_refresh = 0
+        self.font = None
+        self.text_surf = None
+
+    def begin_frame(self):
+        self.frame_start = self.lap_start = time.perf_counter()
+        self.phase_times = {}
+        self.counts = Counter()
+
+    """ Ends the current phase, everything since the last lap (or the start of the frame) is counted towards `phase` """
+    def lap(self,phase:str):
+        now = time.perf_counter()
+        self.phase_times[phase] = self.phase_times.get(phase,0.0) + now - self.lap_start
+        self.lap_start = now
+
+    def end_frame(self):
+        if self.frame_start is None: return
+        self.frame_times.append(time.perf_counter() - self.frame_start)
+        self.last_phase_times = self.phase_times
+        self.last_counts = self.counts
+        self.frames_since_refresh += 1
+
+    """ RETURNS (mean, p95, p99, max) frame time over the window, in seconds """
+    def stats(self) -> tuple:
+        if not self.frame_times: return 0.0,0.0,0.0,0.0
+        values = sorted(self.frame_times)
+        return sum(values)/len(values),percentile(values,95),percentile(values,99),values[-1]
+
+    def text_lines(self) -> list:
+        mean,p95,p99,max_ = self.stats()
+        lines = ['frame  mean {:5.1f}  p95 {:5.1f}  p99 {:5.1f}  max {:5.1f} ms'.format(mean*1000,p95*1000,p99*1000,max_*1000)]
+        lines.append('  '.join('{} {:4.1f}'.format(phase,self.last_phase_times.get(phase,0.0)*1000) for phase in self.PHASES))
+        kinds = sorted({kind for kind,_ in self.last_counts})
+        for kind in kinds:
+            lines.append('{:<12} update {:5d}  draw {:5d}'.format(kind,self.last_counts[(kind,'update')],self.last_counts[(kind,'draw')]))
+        return lines
+
+    def render_text(self) -> pygame.Surface:
+        if self.font is None:
+            self.font = pygame.font.Font(None,20)
+        # these strings change every refresh, so they dont go through textcache (they would only push everything else out)
+        rendered = [self.font.render(line,True,WHITE) for line in self.text_lines()]
+        w = max(surf.get_width() for surf in rendered)
+        h = sum(surf.get_height() for surf in rendered)
+        surf = pygame.Surface((w,h),pygame.SRCALPHA)
+        y = 0
+        for line in rendered:
+            surf.blit(line,(0,y))
+            y += line.get_height()
+        return surf
+
+    def draw_graph(self,surface,rect):
+        pygame.draw.rect(surface,BLACK,rect)
+        # a frame at the target frame rate reaches halfway up
+        budget = 1/RENDER_FPS
+        scale = rect.h / (2*budget)
+        pygame.draw.line(surface,GREEN,(rect.x,rect.bottom - budget*scale),(rect.right-1,rect.bottom - budget*scale))
+        times = list(self.frame_times)[-rect.w:]
+        x = rect.right - len(times)
+        for t in times:
+            h = min(rect.h,int(t*scale))
+            color = WHITE if t <= budget else RED
+            pygame.draw.line(surface,color,(x,rect.bottom-1),(x,rect.bottom-h))
+            x += 1
+
+    """ Draws the overlay in the top right corner. RETURNS the rect it covers """
+    def draw(self,surface) -> pygame.Rect:
+        # the text only changes a few times a second, otherwise it is unreadable anyway
+        if self.text_surf is None or self.frames_since_refresh >= PROFILER_TEXT_REFRESH:
+            self.text_surf = self.render_text()
+            self.frames_since_refresh = 0
+        pad = 6
+        graph_h = 50
+        w = max(self.text_surf.get_width(),PROFILER_WINDOW//2) + 2*pad
+        h = self.text_surf.get_height() + graph_h + 3*pad
+        rect = pygame.Rect(surface.get_width() - w - 10,10,w,h)
+        pygame.draw.rect(surface,(20,20,20),rect)
+        surface.blit(self.text_surf,(rect.x+pad,rect.y+pad))
+        self.draw_graph(surface,pygame.Rect(rect.x+pad,rect.bottom-pad-graph_h,w-2*pad,graph_h))
+        return rect
@@ -1,15 +1,21 @@
 import pygame
 from constants import *
 from ball import Ball
-from block import Block
+from block import Block, StaticBlock, MovingBlock
+from serde import BinaryLevel, _number
 from enum import Enum
+import physics
+import frameprofiler
+import tracing
+from collections import Counter
+from physics import EventBus, PhysicsEvent
+from spatial import build_level_grid
+from bake import bake_objects
+from textcache import render_text
+from preview import TrajectoryPreview
 
 import time
 
-putt_sound = pygame.mixer.Sound("assets/audio/applause.mp3")
-putt_sound.set_volume(1)
-
-
 class LevelState(Enum): 
     PLAYING = 1
     WON = 2
@@ -21,13 +27,15 @@ class Level:
     def __init__(self,screen,start,end,objs,switchstateonwin=None,is_premade:bool=False,level_num=None):
         self.screen = screen
         self.ball_start = start
-        self.ball = Ball(self.screen,start[0],start[1])
+        # Rendering and audio subscribe to these, the level itself never plays sounds
+        self.events = EventBus()
+        self.ball = Ball(self.screen,start[0],start[1],self.events)
         self.ball_end = end
-        self.objects = objs
+        self.set_objects(objs)
         self.is_premade = is_premade
         self.level_num = level_num
 
-        self.hasplayed_sound = False
+        self.has_emitted_holed = False
 
         self.state = LevelState.PLAYING
         # This stores the initial and final/current position of the mouse when it was first clicked at the start of every shot
@@ -36,10 +44,16 @@ class Level:
 
         self.num_strokes = 0
         self.start_time = time.time()
+        # physics steps since the level was (re)loaded, shots get recorded against this
+        self.frame = 0
+        # a replay.ShotRecorder while the level is being recorded
+        self.recorder = None
 
-        # text stuff (make sure you call pygame.font.init() before)
-        # default_font = pygame.font.get_default_font()
-        self.font = pygame.font.Font(None,40)
+        # text stuff, created on the first draw so a level can be simulated without pygame.font.init()
+        self.font = None
+        # the stroke counter only gets rendered again when the count changes
+        self.strokes_text = None
+        self.strokes_text_count = None
 
         self.level_end_anim = 0.0
 
@@ -47,67 +61,103 @@ class Level:
             self.state = LevelState.WON
             self.ball.rect.x = self.ball_end[0]
             self.ball.rect.y = self.ball_end[1]
+            self.ball.prev_pos = self.ball.rect.topleft
             self.level_end_anim = 0.0
-            if not self.hasplayed_sound:
-                self.hasplayed_sound=True
-                putt_sound.play()
+            if not self.has_emitted_holed:
+                self.has_emitted_holed = True
+                tracing.instant('holed','physics',frame=self.frame,strokes=self.num_strokes)
+                self.events.emit(PhysicsEvent.Holed,self.ball)
 
         self.onlevelwin = onlevelwin
         self.switchstateonwin = None
 
-    def draw(self):
-
-        if self.mouse_initial_pos is not None and self.mouse_final_pos is not None :
-            mouse_pos_initial_v = pygame.math.Vector2(self.mouse_initial_pos or (self.ball.rect.x,self.ball.rect.y))
-            mouse_pos_final_v = pygame.math.Vector2(self.mouse_final_pos or (self.ball.rect.x,self.ball.rect.y))
-            dir_v =  mouse_pos_initial_v - mouse_pos_final_v
-            if dir_v.magnitude() != 0:
+    """ `interpolation` (0 to 1) is how far we are between the last physics step and the next, moving things get drawn in between """
+    def draw(self,interpolation:float=1.0):
+        self.draw_aim()
+        for obj in self.baked_objects:
+            obj.draw(interpolation)
+        pygame.draw.circle(self.screen,BLACK,self.ball_end,HOLE_RADIUS)
+        self.ball.draw(interpolation)
+        self.draw_hud()
+        frameprofiler.count('Ball','draw')
+        frameprofiler.count_all(self.object_types,'draw')
 
-                x_vector = pygame.math.Vector2(1,0)
+    """ Draws the parts of the level that never change after loading (static blocks and the hole) onto `surface` """
+    def draw_static(self,surface):
+        for obj in self.baked_objects:
+            if not isinstance(obj.inner,MovingBlock):
+                obj.inner.draw(surface)
+        pygame.draw.circle(surface,BLACK,self.ball_end,HOLE_RADIUS)
 
-                theta = dir_v.angle_to(x_vector)
+    """ Draws the aiming arrow and the predicted path while the mouse is held down. RETURNS the rect it drew over, or None """
+    def draw_aim(self):
+        if self.mouse_initial_pos is None or self.mouse_final_pos is None: return None
+        mouse_pos_initial_v = pygame.math.Vector2(self.mouse_initial_pos or (self.ball.rect.x,self.ball.rect.y))
+        mouse_pos_final_v = pygame.math.Vector2(self.mouse_final_pos or (self.ball.rect.x,self.ball.rect.y))
+        dir_v =  mouse_pos_initial_v - mouse_pos_final_v
+        if dir_v.magnitude() == 0: return None
 
-                dir_ = dir_v.normalize()
-                rect = self.ball.rect
-                radius = self.ball.radius
-                o = pygame.math.Vector2(rect.x+radius,rect.y+radius)
-                p1_ = pygame.math.Vector2(BALL_RADIUS,0)
-                p2_ = pygame.math.Vector2(-BALL_RADIUS,0)
-                p3_ = pygame.math.Vector2(0,-BALL_RADIUS) 
+        x_vector = pygame.math.Vector2(1,0)
 
-                p1 = o + p1_.rotate(90-theta)
-                p2 = o + p2_.rotate(90-theta)
-                p3 = o + p3_.rotate(90-theta) *  max(2,dir_v.magnitude()//50) 
-                pygame.draw.polygon(self.screen,WHITE,[p1,p2,p3])
+        theta = dir_v.angle_to(x_vector)
 
-        for obj in self.objects:
-            obj.draw()
-        pygame.draw.circle(self.screen,BLACK,self.ball_end,HOLE_RADIUS)
-        
-        self.ball.draw()
+        rect = self.ball.rect
+        radius = self.ball.radius
+        o = pygame.math.Vector2(rect.x+radius,rect.y+radius)
+        p1_ = pygame.math.Vector2(BALL_RADIUS,0)
+        p2_ = pygame.math.Vector2(-BALL_RADIUS,0)
+        p3_ = pygame.math.Vector2(0,-BALL_RADIUS) 
 
-        text_surface = self.font.render('Number of strokes: {}'.format(self.num_strokes),True,WHITE)
-        self.screen.blit(text_surface,(BORDER_SIZE+10,30))
+        p1 = o + p1_.rotate(90-theta)
+        p2 = o + p2_.rotate(90-theta)
+        p3 = o + p3_.rotate(90-theta) *  max(2,dir_v.magnitude()//50) 
+        drawn = pygame.draw.polygon(self.screen,WHITE,[p1,p2,p3])
+        path = self.preview.draw(self.screen,self.mouse_initial_pos,self.mouse_final_pos)
+        return drawn if path is None else drawn.union(path)
 
+    """ Draws the stroke counter. RETURNS the rect it drew over """
+    def draw_hud(self):
+        if self.font is None:
+            self.font = pygame.font.Font(None,40)
+        if self.strokes_text_count != self.num_strokes:
+            self.strokes_text = render_text(self.font,'Number of strokes: {}'.format(self.num_strokes),True,WHITE)
+            self.strokes_text_count = self.num_strokes
+        return self.screen.blit(self.strokes_text,(BORDER_SIZE+10,30))
 
+    def update(self):
+        with tracing.span('Level.update','physics'):
+            self.update_state()
+        self.frame += 1
+        if self.recorder is not None:
+            self.recorder.frame(self)
 
+    """
+        Turbo: steps the level until the ball stops, drops into the hole or `budget` seconds have passed.
+        Goes through update(), so the frame count and recordings are the same as without turbo. RETURNS the number of steps
+    """
+    def fast_forward(self,budget:float) -> int:
+        deadline = time.perf_counter() + budget
+        steps = 0
+        while True:
+            self.update()
+            steps += 1
+            if not self.ball.is_moving() or self.state != LevelState.PLAYING or time.perf_counter() >= deadline:
+                return steps
 
-    def update(self):
+    def update_state(self):
+        self.ball.prev_pos = self.ball.rect.topleft
         if self.state == LevelState.WON and self.level_end_anim == 1.0 and self.switchstateonwin: 
             self.switchstateonwin()
 
-        end_rect = pygame.Rect(self.ball_end[0],self.ball_end[1],HOLE_RADIUS,HOLE_RADIUS)
-
-        ball_rect = self.ball.rect
-        if ball_rect.colliderect(end_rect):
+        if physics.is_holed(self.ball,self.ball_end):
             self.state = LevelState.WON
             self.onlevelwin()
             
         match self.state:
             case LevelState.PLAYING:
-                self.ball.update(self.objects)
-                for obj in self.objects:
-                    obj.update()
+                physics.step(self.ball,self.baked_objects,self.events,self.grid)
+                frameprofiler.count('Ball','update')
+                frameprofiler.count_all(self.object_types,'update')
             case LevelState.WON:
                 if self.ball.radius > 1.0:
                    self.ball.radius -= 0.5 * self.ball.radius/10
@@ -136,33 +186,81 @@ class Level:
                 pos = event.pos
                 if btn == MOUSE_BUTTON_ONE:
                     self.mouse_final_pos = pos
-                    self.ball.calc_force(self.mouse_initial_pos or (0,0),self.mouse_final_pos or (0,0))
-                    if (pygame.math.Vector2(self.mouse_initial_pos)-pygame.math.Vector2(self.mouse_final_pos)).magnitude() != 0:
-                        self.num_strokes += 1
+                    self.shoot(self.mouse_initial_pos or (0,0),self.mouse_final_pos or (0,0))
                 self.mouse_initial_pos = None
                 self.mouse_final_pos = None
                 return True
         return False
 
+    """ Shoots the ball as if the mouse was dragged from `initial_pos` to `final_pos`, this is all the input a level ever gets """
+    def shoot(self,initial_pos,final_pos):
+        if self.recorder is not None:
+            self.recorder.shot(self,initial_pos,final_pos)
+        self.ball.calc_force(initial_pos,final_pos)
+        if (pygame.math.Vector2(initial_pos)-pygame.math.Vector2(final_pos)).magnitude() != 0:
+            self.num_strokes += 1
+            # marks the shot in the trace, so the frames after it are easy to find
+            tracing.instant('shot','physics',frame=self.frame,strokes=self.num_strokes)
+
     def handle_input(self,event):
         return self.handle_mouse_event(event)
 
     def from_dict(self,dict_):
         # We can also just error out if we dont find any of these
         start = dict_.get('ball_start') or (0,0)
-        self.ball_start = start
-        self.ball = Ball(self.screen,start[0],start[1])
-        self.ball_end = dict_.get('ball_end') or (10,10)
+        end = dict_.get('ball_end') or (10,10)
         objs = [  Block(self.screen,None) for _ in range(len(dict_.get('objects') or [])) ]
         for i,o in enumerate(dict_.get('objects') or []):
             objs[i].from_dict(o)
-        self.objects = objs
+        self.set_level(start,end,objs)
+
+    """ Same as from_dict, but for a serde.BinaryLevel. The blocks are built straight from its arrays, without going through dicts """
+    def from_binary(self,level:BinaryLevel):
+        moving = level.moving_index()
+        objs = []
+        for i in range(level.n_objects):
+            x,y,w,h = level.rect(i)
+            m = moving.get(i)
+            if m is None:
+                inner = StaticBlock(x,y,w,h)
+            else:
+                # an int speed comes back as an int, like BinaryLevel.to_dict gives it, so to_dict matches the level loaded from JSON
+                inner = MovingBlock(x,y,w,h,_number(level.speeds[m]),[])
+                inner.checkpoints = [pygame.math.Vector2(c) for c in level.checkpoints_of(m)]
+                inner.current_checkpoint = level.current_checkpoints[m]
+            objs.append(Block(self.screen,inner))
+        self.set_level(level.ball_start,level.ball_end,objs)
+
+    """ Puts a new ball and blocks in and starts the level over """
+    def set_level(self,start,end,objs):
+        self.ball_start = start
+        self.ball = Ball(self.screen,start[0],start[1],self.events)
+        self.ball_end = end
+        self.set_objects(objs)
 
         # These things i dont think we'll be using
         self.state = LevelState.PLAYING
         self.mouse_initial_pos = None
         self.mouse_final_pos = None
         self.num_strokes = 0
+        self.has_emitted_holed = False
+        self.frame = 0
+
+    """
+        self.objects keeps the blocks exactly as they were made (the editor and to_dict use these),
+        while collisions and drawing go through the baked copy where touching static blocks are merged together
+    """
+    def set_objects(self,objs):
+        self.objects = objs
+        self.baked_objects = bake_objects(objs,self.screen)
+        # the only blocks that have to be drawn again every frame, everything else goes into the renderer's static layer
+        self.moving_objects = [obj for obj in self.baked_objects if isinstance(obj.inner,MovingBlock)]
+        # how many blocks of each type there are, for the frame profiler
+        self.object_types = Counter(type(obj.inner).__name__ for obj in self.baked_objects)
+        # broadphase for ball vs block collisions, built once here and only touched again for moving blocks
+        self.grid = build_level_grid(self.baked_objects)
+        self.preview = TrajectoryPreview(self)
+
     def to_dict(self):
         d = {}
         d['ball_start'] = self.ball_start
@@ -1,14 +1,15 @@
 import pygame
 from constants import *
 from level import Level
+from catalog import LEVEL_CATALOG
 from ui_misc import *
-from main import SCREEN,CLOCK
+import runtime
 
 from math import sin
 from enum import Enum
 
 
-WIN_TITLE_FONT = load_game_font(40)
+WIN_TITLE_FONT = GameFont(40)
 
 class LevelOverMenu:
     def __init__(self,cur_level,num_strokes,onnextlevelbuttonclicked,onbackbuttonclicked,next_level_num):
@@ -24,11 +25,11 @@ class LevelOverMenu:
         
         MENU_POS = (SCREEN_W/2-MENU_SIZE[0]/2,SCREEN_H/2-MENU_SIZE[1]/2)
         self.menu_rect = pygame.Rect(MENU_POS[0],MENU_POS[1],MENU_SIZE[0],MENU_SIZE[1])
-        self.title_txt =  WIN_TITLE_FONT.render("You Win!",True,ACCENT)
+        self.title_txt =  render_text(WIN_TITLE_FONT,"You Win!",True,ACCENT)
         self.title_pos = (SCREEN_W//2-self.title_txt.get_width()//2, MENU_POS[1])
 
 
-        self.num_strokes_txt =  SMALL_FONT.render("Number of strokes:"+str(self.num_strokes),True,ACCENT)
+        self.num_strokes_txt =  render_text(SMALL_FONT,"Number of strokes:"+str(self.num_strokes),True,ACCENT)
         self.num_strokes_pos =  (SCREEN_W//2-self.num_strokes_txt.get_width()//2,MENU_POS[1]+self.title_txt.get_height()+PADDING)
 
         play_next_size = (2*MENU_SIZE[0]/3,BUTTON_H)
@@ -39,16 +40,16 @@ class LevelOverMenu:
 
     def draw(self):
         now = pygame.time.get_ticks() / 1000.0
-        dt = CLOCK.get_time()/1000.0
+        dt = runtime.CLOCK.get_time()/1000.0
         mouse_pos = pygame.mouse.get_pos()
         
-        pygame.draw.rect(SCREEN,LIGHT_GREEN,self.menu_rect)
+        pygame.draw.rect(runtime.SCREEN,LIGHT_GREEN,self.menu_rect)
 
-        SCREEN.blit(self.title_txt,self.title_pos)
-        SCREEN.blit(self.num_strokes_txt,self.num_strokes_pos)
-        if self.is_premade and self.next_level_num <= len(LEVELS_DICTS)-1:
-            draw_button_scaled(SCREEN,self.play_next_rect,"Play Next",self.hover_state["next"])
-        draw_button_scaled(SCREEN,self.back_to_menu_rect,"Back to Menu",self.hover_state["back"])
+        runtime.SCREEN.blit(self.title_txt,self.title_pos)
+        runtime.SCREEN.blit(self.num_strokes_txt,self.num_strokes_pos)
+        if self.is_premade and self.next_level_num <= LEVEL_CATALOG.count()-1:
+            draw_button_scaled(runtime.SCREEN,self.play_next_rect,"Play Next",self.hover_state["next"])
+        draw_button_scaled(runtime.SCREEN,self.back_to_menu_rect,"Back to Menu",self.hover_state["back"])
     
     def update(self):
         mouse_pos = pygame.mouse.get_pos()
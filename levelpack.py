@@ -0,0 +1,117 @@
+"""
+    Level packs.
+    Many levels in one file: a header, an index of (level id, offset, length, sha1) for every level, then the level blobs one after another.
+    The pack is memory mapped and only the index is read up front, so loading level n is a lookup and a slice no matter how many levels there are.
+    Blobs are level files as they would be on disk (binary or JSON, see serde.parse_level).
+
+    Layout (little endian):
+        header   PACK_HEADER                 magic, version, number of levels
+        index    PACK_INDEX_ENTRY * count    sorted by level id
+        blobs
+
+    Level ids only give the order, the catalog numbers the levels of a pack 1,2,3.. in that order like it does the files of a directory.
+"""
+
+import sys
+import struct
+import hashlib
+
+from serde import parse_level, level_dict_to_binary, is_binary_level
+
+PACK_MAGIC = b'SYSP'
+PACK_VERSION = 1
+# magic, version, reserved, number of levels
+PACK_HEADER = struct.Struct('<4sHHI')
+# level id, offset of the blob from the start of the file, blob length, sha1 of the blob
+PACK_INDEX_ENTRY = struct.Struct('<IQI20s')
+
+
+class PackIndexEntry:
+    def __init__(self,level_id,offset,length,sha1):
+        self.level_id = level_id
+        self.offset = offset
+        self.length = length
+        self.sha1 = sha1
+
+
+""" A level pack opened for reading. Blobs are slices of the mapped file, nothing gets copied until a level is parsed """
+class LevelPack:
+    def __init__(self,path):
+        import mmap
+        self.path = path
+        with open(path,'rb') as file:
+            self.data = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+        if len(self.data) < PACK_HEADER.size:
+            raise ValueError('not a level pack')
+        magic,version,_,count = PACK_HEADER.unpack_from(self.data,0)
+        if magic != PACK_MAGIC:
+            raise ValueError('not a level pack')
+        if version != PACK_VERSION:
+            raise ValueError('unsupported level pack version {}'.format(version))
+        if len(self.data) < PACK_HEADER.size + count*PACK_INDEX_ENTRY.size:
+            raise ValueError('level pack index is truncated')
+
+        # in level id order
+        self.entries = []
+        for i in range(count):
+            entry = PackIndexEntry(*PACK_INDEX_ENTRY.unpack_from(self.data,PACK_HEADER.size + i*PACK_INDEX_ENTRY.size))
+            if entry.offset + entry.length > len(self.data):
+                raise ValueError('level {} runs past the end of the pack'.format(entry.level_id))
+            self.entries.append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    """ The raw blob of a level, a view into the mapped file """
+    def blob(self,entry:PackIndexEntry) -> memoryview:
+        return memoryview(self.data)[entry.offset:entry.offset+entry.length]
+
+    """ Whether the blob still hashes to the sha1 in the index """
+    def verify(self,entry:PackIndexEntry) -> bool:
+        return hashlib.sha1(self.blob(entry)).digest() == entry.sha1
+
+
+"""
+    Writes a pack from `levels`, a list of (level id, blob bytes).
+    The index is sorted by level id, blobs are written in the same order
+"""
+def write_level_pack(path,levels):
+    levels = sorted(levels,key=lambda level: level[0])
+    offset = PACK_HEADER.size + len(levels)*PACK_INDEX_ENTRY.size
+    index = []
+    for level_id,blob in levels:
+        index.append(PACK_INDEX_ENTRY.pack(level_id,offset,len(blob),hashlib.sha1(blob).digest()))
+        offset += len(blob)
+    with open(path,'wb') as file:
+        file.write(PACK_HEADER.pack(PACK_MAGIC,PACK_VERSION,0,len(levels)))
+        for entry in index:
+            file.write(entry)
+        for _,blob in levels:
+            file.write(blob)
+
+"""
+    Packs every level in `levels_path`, numbered the way the level catalog numbers them.
+    JSON levels are converted to the binary format on the way in unless `keep_json` is set
+"""
+def build_level_pack(levels_path,pack_path,keep_json:bool=False):
+    from catalog import LevelCatalog
+    catalog = LevelCatalog(levels_path)
+    levels = []
+    catalog.ensure_scanned()
+    for entry in catalog.entries:
+        blob = entry.read_bytes()
+        if not keep_json and not is_binary_level(blob):
+            blob = level_dict_to_binary(parse_level(blob))
+        levels.append((entry.level_num,blob))
+    write_level_pack(pack_path,levels)
+    return len(levels)
+
+
+""" Builds a pack from a levels directory: python levelpack.py LEVELS_DIR OUT [--json] """
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if a != '--json']
+    if len(args) != 2:
+        print('usage: python levelpack.py LEVELS_DIR OUT [--json]')
+        sys.exit(1)
+    count = build_level_pack(args[0],args[1],keep_json='--json' in sys.argv)
+    print('packed {} levels into {}'.format(count,args[1]))
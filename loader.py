@@ -0,0 +1,61 @@
+"""
+    Background level loading.
+    Reading, parsing and building a level (blocks, baking, the collision grid) happens on a worker thread, so the menus keep
+    drawing while it runs and a level that was asked for early (the next level, while the level over menu is up) is ready the moment it is needed.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+""" `build` turns a main_menu.SelectedLevel into a new Level (or None if it cant be loaded), it gets called on the worker thread """
+class LevelLoader:
+    def __init__(self,build):
+        self.build = build
+        # one worker is enough, levels are asked for one or two at a time
+        self.executor = ThreadPoolExecutor(max_workers=1,thread_name_prefix='level-loader')
+        # (level type, level value) -> Future, for levels asked for but not taken yet
+        self.futures = {}
+
+    def key(self,selected_level):
+        return (selected_level.type,selected_level.val)
+
+    """ Starts building the level in the background (if it isnt already). RETURNS the Future for it """
+    def request(self,selected_level):
+        key = self.key(selected_level)
+        future = self.futures.get(key)
+        if future is None:
+            future = self.executor.submit(self.build,selected_level)
+            self.futures[key] = future
+        return future
+
+    def is_ready(self,selected_level) -> bool:
+        return self.request(selected_level).done()
+
+    """
+        Hands over the built level and forgets about it, waiting for it if it isnt done yet.
+        RETURNS the Level, or None if it couldnt be loaded
+    """
+    def take(self,selected_level):
+        future = self.request(selected_level)
+        del self.futures[self.key(selected_level)]
+        try:
+            return future.result()
+        except Exception as e:
+            print('Could not load level {}: {}'.format(selected_level,e))
+            return None
+
+    """ Forgets a level that was asked for but not taken. If it is already being built it still finishes, it is just dropped """
+    def cancel(self,selected_level):
+        future = self.futures.pop(self.key(selected_level),None)
+        if future is not None:
+            future.cancel()
+
+    """ Forgets every level that was asked for but not taken. Ones already being built still finish, they are just dropped """
+    def discard(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {}
+
+    def shutdown(self):
+        self.discard()
+        self.executor.shutdown(wait=False)
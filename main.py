@@ -1,54 +1,48 @@
+from startup import StartupProfile
 from enum import Enum
 import time
+import sys
 
 import pygame, os
-pygame.font.init()
-pygame.mixer.init()
-
-# SOUND EFFECTS
-hit_sound = pygame.mixer.Sound("assets/audio/start.wav")
-
-putt_sound = pygame.mixer.Sound("assets/audio/putt.wav")
-
-hit_sound.set_volume(0.7)
-hit_sound.delay(2999)
-putt_sound.set_volume(0.8)
 
 from constants import *
-SCREEN = pygame.display.set_mode((SCREEN_W, SCREEN_H))
-CLOCK = pygame.time.Clock()
-
+import runtime
 from main_menu import *
 from ui_misc import *
 from serde import *
 from ball import Ball
-from level import Level
+import audio
+import assets
+from debug import is_debug
 import editor
 from editor import Editor
-from block import Block, StaticBlock, MovingBlock
 from level_over_menu import LevelOverMenu
+from renderer import GameplayRenderer
+from loader import LevelLoader
+import frameprofiler
+import tracing
+from replay import ShotRecorder, save_recording
 
 
-pygame.display.set_caption("Shoot Your Shot")
-
-
-def create_borders():
-    rects = [
-            (0,0,SCREEN_W,BORDER_SIZE), 
-            (0,SCREEN_H-BORDER_SIZE,SCREEN_W,BORDER_SIZE), 
-            (0,BORDER_SIZE,BORDER_SIZE,SCREEN_H-BORDER_SIZE), 
-            (SCREEN_W-BORDER_SIZE,BORDER_SIZE,BORDER_SIZE,SCREEN_H)    
-            ]
-    return [ Block(SCREEN,StaticBlock(v[0],v[1],v[2],v[3])) for v in rects ]
-
-
-
-objs = create_borders()
-LEVEL_0 = Level(SCREEN,(SCREEN_W/2,SCREEN_H/2),(SCREEN_W/2,BORDER_SIZE+BALL_RADIUS + 5),objs)
-LEVEL_1 = Level(SCREEN,(SCREEN_W/2,SCREEN_H/2),(SCREEN_W/2,BORDER_SIZE+BALL_RADIUS + 5),objs)
-LEVEL_1.from_dict(
-{'ball_start': (660, 240), 'ball_end': (150, 270), 'ball': {'rect': {'x': 660, 'y': 240, 'w': 15, 'h': 15}, 'velocity': 0.0, 'dir': {'x': 0.0, 'y': 0.0}}, 'objects': [{'inner': {'rect': {'x': 0, 'y': 0, 'w': 1280, 'h': 30}}}, {'inner': {'rect': {'x': 0, 'y': 690, 'w': 1280, 'h': 30}}}, {'inner': {'rect': {'x': 0, 'y': 30, 'w': 30, 'h': 690}}}, {'inner': {'rect': {'x': 1250, 'y': 30, 'w': 30, 'h': 720}}}, {'inner': {'rect': {'x': 300, 'y': 210, 'w': 30, 'h': 30}}}, {'inner': {'rect': {'x': 360, 'y': 240, 'w': 30, 'h': 30}}}, {'inner': {'rect': {'x': 390, 'y': 240, 'w': 30, 'h': 30}}}, {'inner': {'rect': {'x': 360, 'y': 300, 'w': 30, 'h': 30}}}, {'inner': {'rect': {'x': 480, 'y': 240, 'w': 30, 'h': 30}}}, {'inner': {'rect': {'x': 420, 'y': 300, 'w': 30, 'h': 30}}}]}
-)
+"""
+    Everything importing the game modules doesnt do: starting pygame and opening the window.
+    Has to run once before App is created. `profile` gets a phase for each step
+"""
+def init(profile:StartupProfile=None):
+    profile = profile or StartupProfile()
+    with profile.phase('pygame init'):
+        pygame.font.init()
+    with profile.phase('mixer init'):
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            # no audio device, the game still runs, just without sound
+            print('Could not start the mixer:',e)
+    with profile.phase('display'):
+        runtime.SCREEN = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+        pygame.display.set_caption("Shoot Your Shot")
+        runtime.CLOCK = pygame.time.Clock()
+    return profile
 
 class AppState(Enum):
     Menu = 1,
@@ -56,67 +50,228 @@ class AppState(Enum):
     Editor = 3,
     LevelWon = 4,
 
+"""
+    With a `record_path`, every level played gets recorded and appended to that file (see replay.py).
+    With `turbo` shots are always fast forwarded, not only while space is held
+"""
 class App:
-    def __init__(self):
+    def __init__(self,record_path:str=None,turbo:bool=False):
         self.state = AppState.Menu
+        # leftover time that hasnt been simulated yet, see update()
+        self.accumulator = 0.0
+        # how far we are between the last physics step and the next one, used to smooth out drawing
+        self.interpolation = 1.0
+        # only exists while a level is being played, see draw()
+        self.renderer = None
+        # levels are read and built on a background thread
+        self.loader = LevelLoader(lambda selected_level: selected_level.build_level())
+        # (selected level, callback) for a level that was picked in the menu and is still loading
+        self.pending_level = None
+        self.record_path = record_path
+        self.turbo = turbo
+        self.turbo_key_held = False
+        # the level being recorded right now
+        self.recording_level = None
         
         def oneditor():
-            SCREEN = pygame.display.set_mode((editor.SCREEN_W,editor.SCREEN_H))
-            self.inner = Editor(SCREEN)
+            runtime.SCREEN = pygame.display.set_mode((editor.SCREEN_W,editor.SCREEN_H))
+            self.inner = Editor(runtime.SCREEN)
             self.state = AppState.Editor
         def play():
+            # the level gets built on the loader thread, update() starts it once it is ready
             selected_level = self.inner.selected_level
-            level = self.inner.selected_level.to_level()
+            if self.pending_level is not None and self.loader.key(self.pending_level[0]) != self.loader.key(selected_level):
+                # another level was picked before the last one finished loading, that one isnt wanted anymore
+                self.loader.cancel(self.pending_level[0])
+            self.loader.request(selected_level)
+            self.pending_level = (selected_level,startlevel)
+        def startlevel(selected_level,level):
+            # a broken level file keeps us on the menu
+            if level is None: return
             def onlevelwin():
+                self.stop_recording()
                 self.state = AppState.LevelWon
+                from main_menu import SelectedLevelType, SelectedLevel
+                next_level_num = (self.inner.level_num or 0)+1
+                if self.inner.is_premade:
+                    # have the next level ready by the time Play Next gets clicked
+                    self.loader.request(SelectedLevel(SelectedLevelType.Premade,next_level_num))
                 def newlevel():
-                    from main_menu import SelectedLevelType, SelectedLevel
                     level_num = self.inner.next_level_num or 0
-                    self.inner = SelectedLevel(SelectedLevelType.Premade,level_num).to_level()
-                    self.inner.switchstateonwin = onlevelwin
+                    level = self.loader.take(SelectedLevel(SelectedLevelType.Premade,level_num))
+                    if level is None:
+                        backtomenu()
+                        return
+                    level.switchstateonwin = onlevelwin
+                    audio.subscribe(level.events)
+                    self.start_recording(level,SelectedLevel(SelectedLevelType.Premade,level_num))
+                    self.inner = level
+                    self.state = AppState.Playing
                 def backtomenu():
+                    self.loader.discard()
                     self.state = AppState.Menu
                     self.inner = Menu(play,oneditor) 
-                self.inner = LevelOverMenu(selected_level,self.inner.num_strokes,newlevel,backtomenu,self.inner.level_num+1)
+                self.inner = LevelOverMenu(selected_level,self.inner.num_strokes,newlevel,backtomenu,next_level_num)
             level.switchstateonwin = onlevelwin
+            audio.subscribe(level.events)
+            self.start_recording(level,selected_level)
             self.inner = level
             self.state = AppState.Playing
         self.inner = Menu(play,oneditor)
 
+    def start_recording(self,level,selected_level):
+        if self.record_path is None: return
+        self.stop_recording()
+        level_ref = {'premade':selected_level.val} if selected_level.is_premade() else {'path':selected_level.val}
+        level.recorder = ShotRecorder(level,level_ref)
+        self.recording_level = level
+
+    """ Saves the recording of the level being played, if there is one """
+    def stop_recording(self):
+        level,self.recording_level = self.recording_level,None
+        if level is None or level.recorder is None: return
+        save_recording(self.record_path,level.recorder.to_dict())
+        level.recorder = None
+
     def handle_input(self,event):
+        if event.type in (pygame.KEYDOWN,pygame.KEYUP) and event.key == pygame.K_SPACE:
+            self.turbo_key_held = event.type == pygame.KEYDOWN
         return self.inner.handle_input(event)
 
-    def update(self):
-        self.inner.update()
+    def is_fast_forwarding(self) -> bool:
+        return (self.turbo or self.turbo_key_held) and self.state == AppState.Playing and self.inner.ball.is_moving()
+
+    """
+        Advances the game by `frame_time` seconds in fixed STEP_BY steps, or while fast forwarding a shot by as many steps as fit in TURBO_FRAME_BUDGET.
+        RETURNS the number of steps taken
+    """
+    def update(self,frame_time:float):
+        if self.pending_level is not None:
+            selected_level,onready = self.pending_level
+            if self.loader.is_ready(selected_level):
+                self.pending_level = None
+                onready(selected_level,self.loader.take(selected_level))
+        if self.is_fast_forwarding():
+            # as many steps as fit in the budget, and the frame shows where they got to
+            self.accumulator = 0.0
+            self.interpolation = 1.0
+            return self.inner.fast_forward(TURBO_FRAME_BUDGET)
+        self.accumulator += min(frame_time,MAX_FRAME_TIME)
+        steps = 0
+        while self.accumulator >= STEP_BY:
+            if steps == MAX_STEPS_PER_FRAME:
+                # too far behind, give up on the rest rather than spiral
+                self.accumulator = 0.0
+                break
+            self.inner.update()
+            self.accumulator -= STEP_BY
+            steps += 1
+        self.interpolation = self.accumulator / STEP_BY
+        return steps
     
+    """
+        Draws the current frame.
+        RETURNS the rects that changed on screen, or None if the whole screen was redrawn
+    """
     def draw(self):
+        if self.state == AppState.Playing:
+            if self.renderer is None or self.renderer.level is not self.inner:
+                self.renderer = GameplayRenderer(self.inner,runtime.SCREEN)
+            return self.renderer.draw(self.interpolation)
+        # menus redraw everything, so the next level starts with a fresh renderer
+        self.renderer = None
+        runtime.SCREEN.fill(BG_COLOR)
         self.inner.draw()
+        return None
+
+    """ Makes the next frame redraw the whole screen """
+    def invalidate(self):
+        if self.renderer is not None:
+            self.renderer.invalidate()
 
     def switch_to_level(self,level):
         self.state = AppState.Playing
         self.inner = level
 
 
-def main_loop():
-    app = App()
+""" Runs the game. With a `profile`, prints how long startup took once the first frame is on screen and quits """
+def main_loop(profile:StartupProfile=None,record_path:str=None,turbo:bool=False):
+    if profile:
+        with profile.phase('menu'):
+            app = App(record_path,turbo)
+    else:
+        app = App(record_path,turbo)
     running = True
+    first_frame = True
+    last_time = time.perf_counter()
+    # with debug on, time every frame and draw the profiler overlay on top
+    profiler = frameprofiler.FrameProfiler() if is_debug else None
+    frameprofiler.active = profiler
 
     while running:
-        SCREEN.fill(BG_COLOR)
+        now = time.perf_counter()
+        frame_time = now - last_time
+        last_time = now
+        if profiler: profiler.begin_frame()
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
                 break 
+            if event.type == pygame.WINDOWEXPOSED:
+                app.invalidate()
             if app.handle_input(event):
                 continue
-        app.update()
-        app.draw()
+        if profiler: profiler.lap('events')
+        with tracing.span('App.update','loop'):
+            app.update(frame_time)
+        if profiler: profiler.lap('update')
+        with tracing.span('App.draw','loop'):
+            dirty_rects = app.draw()
+        if profiler:
+            overlay = profiler.draw(runtime.SCREEN)
+            if dirty_rects is not None:
+                dirty_rects.append(overlay)
+            profiler.lap('draw')
 
+        with tracing.span('flip','loop'):
+            if dirty_rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty_rects)
+        if profiler:
+            profiler.lap('flip')
+            profiler.end_frame()
 
-        pygame.display.flip()
-        CLOCK.tick(FPS)
+        if first_frame:
+            first_frame = False
+            if profile:
+                profile.mark_first_frame()
+                print(profile.report())
+                running = False
+            elif pygame.mixer.get_init():
+                # decode the rest of the sounds while the intro plays instead of when they are first needed
+                assets.warm()
+        runtime.CLOCK.tick(RENDER_FPS)
+        tracing.complete('main_loop','loop',now,time.perf_counter())
 
+    app.stop_recording()
+    app.loader.shutdown()
+    audio.shutdown()
+    if is_debug:
+        print(assets.format_memory_report())
     pygame.quit()
 
 if __name__ == "__main__":
-    main_loop()
+    profile = StartupProfile()
+    profile.mark_since_start('imports')
+    init(profile)
+    # --trace FILE records a timeline of the session, see tracing.py
+    if '--trace' in sys.argv[:-1]:
+        tracing.start(sys.argv[sys.argv.index('--trace')+1])
+    # --record FILE appends a recording of every level played, see replay.py
+    record_path = sys.argv[sys.argv.index('--record')+1] if '--record' in sys.argv[:-1] else None
+    try:
+        main_loop(profile if '--startup-profile' in sys.argv else None,record_path,'--turbo' in sys.argv)
+    finally:
+        tracing.stop()
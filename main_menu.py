@@ -2,12 +2,16 @@ import pygame
 from constants import *
 from level import Level
 from ui_misc import *
-from main import SCREEN,CLOCK,LEVEL_0
+import assets
+import audio
+from catalog import LEVEL_CATALOG, load_level_file
+from serde import BinaryLevel
+import runtime
+import tracing
 
 from math import sin
 from enum import Enum
 
-hit_sound = pygame.mixer.Sound("assets/audio/start.wav")
 
 class MenuState(Enum):
     Intro = 1,
@@ -26,8 +30,11 @@ class Menu:
         self.hover_state = {"play": 0.0, "editor": 0.0, "settings": 0.0}
         self.settings_anim = {"music": 0.0, "sfx": 0.0}
 
-        hit_sound.play()
+        # started after the first frame is drawn, decoding it would only slow that frame down
+        self.intro_sound_started = False
 
+        # the intro zooms get scaled one per frame while the intro plays (see draw), so the first frame doesnt wait for all of them
+        self.intro_zooms_left = list(INTRO_ZOOMS)
         self.intro_start_time = pygame.time.get_ticks() / 1000.0
         self.onplaybuttonclicked = onplaybuttonclicked
         self.oneditorbuttonclicked = oneditorbuttonclicked
@@ -36,15 +43,19 @@ class Menu:
 
         now = pygame.time.get_ticks() / 1000.0
         intro_progress = min(1.0, max(0.0, (now - self.intro_start_time) / INTRO_DURATION))
-        dt = CLOCK.get_time() / 1000.0
+        dt = runtime.CLOCK.get_time() / 1000.0
         mouse_pos = pygame.mouse.get_pos()
         update_hover_states(mouse_pos, dt,self.hover_state,self.settings,self.settings_anim)
 
         match self.state:
             case MenuState.Intro:
                 ui_drawn = draw_main_menu_with_intro(mouse_pos, intro_progress,self.hover_state)
+                if self.intro_zooms_left:
+                    prerender_bg_zooms(assets.get('background'), runtime.SCREEN.get_size(), [self.intro_zooms_left.pop(0)])
                 if intro_progress >= 1.0:
                     self.state = MenuState.Main 
+                    # the intro frames arent needed anymore
+                    clear_bg_cache()
             case MenuState.Main:
                 ui_drawn = draw_main_menu_normal(mouse_pos,self.hover_state)
             case MenuState.Settings:
@@ -55,6 +66,10 @@ class Menu:
                 ui_drawn = draw_main_menu_normal(mouse_pos,self.hover_state)
         self.ui_drawn = ui_drawn
 
+        if not self.intro_sound_started:
+            self.intro_sound_started = True
+            audio.play_soon('start')
+
     def handle_input(self,event):
         if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 if self.state == MenuState.Main:
@@ -72,6 +87,8 @@ class Menu:
                     settings_r = get_inflated_drawn(self.ui_drawn, "settings")
                     if play_r.collidepoint(pos):
 
+                        # pick up levels added or changed since the selector was last opened
+                        LEVEL_CATALOG.refresh()
                         self.state = MenuState.Levels
                         return True
                     elif editor_r.collidepoint(pos):
@@ -91,9 +108,9 @@ class Menu:
                     if music_box.collidepoint(pos) or music_pill.collidepoint(pos):
 
                         if self.settings['music']: 
-                            hit_sound.stop()
+                            audio.stop('start')
                         else:
-                            hit_sound.play()
+                            audio.play('start')
                         self.settings["music"] = not self.settings.get("music", True)
                         return True
                     # Toggle SFX similarly
@@ -115,7 +132,7 @@ class Menu:
                         if r.collidepoint(pos):
                             self.selected_level = SelectedLevel(SelectedLevelType.Premade,lvl) 
                               
-                            hit_sound.stop()
+                            audio.stop('start')
                             if self.onplaybuttonclicked: self.onplaybuttonclicked()
 
                             return True
@@ -126,7 +143,7 @@ class Menu:
                         self.selected_level = SelectedLevel(SelectedLevelType.Custom,file)
 
 
-                        hit_sound.stop()
+                        audio.stop('start')
                         if self.onplaybuttonclicked: self.onplaybuttonclicked()
 
                     if self.ui_drawn["back"].collidepoint(pos):
@@ -137,35 +154,51 @@ class Menu:
     def update(self):
         # show selected level hint on main
         if self.state == MenuState.Main and self.selected_level:
-            txt = SMALL_FONT.render(f"Selected Level: {self.selected_level}", True, ACCENT)
-            SCREEN.blit(txt, (SCREEN_W//2 - txt.get_width()//2, SETTINGS_Y + 90))
+            txt = render_text(SMALL_FONT, f"Selected Level: {self.selected_level}", True, ACCENT)
+            runtime.SCREEN.blit(txt, (SCREEN_W//2 - txt.get_width()//2, SETTINGS_Y + 90))
+
+
+# The zoom levels the intro animation snaps to
+INTRO_ZOOMS = [INTRO_ZOOM_MIN + (INTRO_ZOOM_MAX - INTRO_ZOOM_MIN) * i / (INTRO_ZOOM_FRAMES - 1) for i in range(INTRO_ZOOM_FRAMES)]
+
+def nearest_intro_zoom(zoom):
+    return min(INTRO_ZOOMS, key=lambda z: abs(z - zoom))
 
+TITLE_TEXT = "SHOOT YOUR SHOT"
+# how far each shadow sits from the title, drawn back to front
+TITLE_SHADOWS = [(8, (60,60,60)), (5, (30,30,30)), (3, (0,0,0))]
+
+# The shadows and the title, rendered once, as (surface, position at y_offset 0) in drawing order.
+# They stay separate blits because flattening them into one alpha surface changes how the antialiased edges blend
+def build_title_layer(size, color):
+    sw, _ = size
+    layers = []
+    for offset, shadow_color in TITLE_SHADOWS:
+        shadow = render_text(TITLE_FONT, TITLE_TEXT, True, shadow_color)
+        layers.append((shadow, shadow.get_rect(center=(sw//2 + offset, 110 + offset)).topleft))
+    title_main = render_text(TITLE_FONT, TITLE_TEXT, True, color)
+    layers.append((title_main, title_main.get_rect(center=(sw//2, 110)).topleft))
+    return layers
 
 # Title with layered shadow + cyan main color
 def draw_title(surface, y_offset=0, color=(100,255,255)):
-    title_text = "SHOOT YOUR SHOT"
-    title_main = TITLE_FONT.render(title_text, True, color)
-    shadow3 = TITLE_FONT.render(title_text, True, (60,60,60))
-    shadow2 = TITLE_FONT.render(title_text, True, (30,30,30))
-    shadow1 = TITLE_FONT.render(title_text, True, (0,0,0))
-    surface.blit(shadow3, shadow3.get_rect(center=(SCREEN_W//2 + 8, 110 + 8 + y_offset)))
-    surface.blit(shadow2, shadow2.get_rect(center=(SCREEN_W//2 + 5, 110 + 5 + y_offset)))
-    surface.blit(shadow1, shadow1.get_rect(center=(SCREEN_W//2 + 3, 110 + 3 + y_offset)))
-    surface.blit(title_main, title_main.get_rect(center=(SCREEN_W//2, 110 + y_offset)))
+    for layer, (x, y) in get_layer(('title', color), surface.get_size(), lambda size: build_title_layer(size, color)):
+        surface.blit(layer, (x, y + y_offset))
 
 # Draw main menu during intro (returns drawn rects)
+@tracing.traced('menu')
 def draw_main_menu_with_intro(mouse_pos, intro_t,hover_state):
-    zoom = 1.05 + 0.08 * sin(pygame.time.get_ticks() / 1900)
+    zoom = nearest_intro_zoom(1.05 + 0.08 * sin(pygame.time.get_ticks() / 1900))
 
-    blit_bg_with_zoom(SCREEN, BG_IMG, zoom)
-    draw_geometric_overlay(SCREEN)
+    blit_bg_with_zoom(runtime.SCREEN, assets.get('background'), zoom)
+    draw_geometric_overlay(runtime.SCREEN)
 
     # title slide
     start_y, end_y = -120, 0
     t_title = min(max((intro_t * 1.05), 0.0), 1.0)
     title_ease = 1 - (1 - t_title) ** 9
     y_offset = int(start_y * (1 - title_ease) + end_y * title_ease)
-    draw_title(SCREEN, y_offset=y_offset)
+    draw_title(runtime.SCREEN, y_offset=y_offset)
 
     bases = [
         pygame.Rect(BUTTON_X, PLAY_Y, BUTTON_W, BUTTON_H),
@@ -180,36 +213,38 @@ def draw_main_menu_with_intro(mouse_pos, intro_t,hover_state):
         p_ease = 1 - (1 - p) ** 3
         scale_override = 0.5 + 0.5 * p_ease
         key = ("play","editor","settings")[i]
-        rect_drawn = draw_button_scaled(SCREEN, base, labels[i], hover_state[key], scale_override=scale_override)
+        rect_drawn = draw_button_scaled(runtime.SCREEN, base, labels[i], hover_state[key], scale_override=scale_override)
         drawn[key] = rect_drawn
 
-    hint = SMALL_FONT.render("Press ESC to go back / quit", True, ACCENT)
-    SCREEN.blit(hint, (12, SCREEN_H - 28))
+    hint = render_text(SMALL_FONT, "Press ESC to go back / quit", True, ACCENT)
+    runtime.SCREEN.blit(hint, (12, SCREEN_H - 28))
     return drawn
 
 # Draw normal main menu (post-intro)
+@tracing.traced('menu')
 def draw_main_menu_normal(mouse_pos,hover_state):
-    blit_bg_with_zoom(SCREEN, BG_IMG, 1.06)
-    draw_geometric_overlay(SCREEN)
-    draw_title(SCREEN)
+    blit_bg_with_zoom(runtime.SCREEN, assets.get('background'), 1.06)
+    draw_geometric_overlay(runtime.SCREEN)
+    draw_title(runtime.SCREEN)
 
     base_play = pygame.Rect(BUTTON_X, PLAY_Y, BUTTON_W, BUTTON_H)
     base_editor = pygame.Rect(BUTTON_X, LEVEL_Y, BUTTON_W, BUTTON_H)
     base_settings = pygame.Rect(BUTTON_X, SETTINGS_Y, BUTTON_W, BUTTON_H)
 
-    play_drawn = draw_button_scaled(SCREEN, base_play, "PLAY", hover_state["play"])
-    editor_drawn = draw_button_scaled(SCREEN, base_editor, "EDITOR", hover_state["editor"])
-    settings_drawn = draw_button_scaled(SCREEN, base_settings, "SETTINGS", hover_state["settings"])
-    hint = SMALL_FONT.render("Press ESC to go back / quit", True, ACCENT)
-    SCREEN.blit(hint, (12, SCREEN_H - 28))
+    play_drawn = draw_button_scaled(runtime.SCREEN, base_play, "PLAY", hover_state["play"])
+    editor_drawn = draw_button_scaled(runtime.SCREEN, base_editor, "EDITOR", hover_state["editor"])
+    settings_drawn = draw_button_scaled(runtime.SCREEN, base_settings, "SETTINGS", hover_state["settings"])
+    hint = render_text(SMALL_FONT, "Press ESC to go back / quit", True, ACCENT)
+    runtime.SCREEN.blit(hint, (12, SCREEN_H - 28))
     return {"play": play_drawn, "editor": editor_drawn, "settings": settings_drawn}
 
 # Settings menu: boxed rows, icons, pill toggles (music & sfx)
+@tracing.traced('menu')
 def draw_settings_menu(mouse_pos,settings_anim,settings):
-    blit_bg_with_zoom(SCREEN, BG_IMG, 1.06)
-    draw_geometric_overlay(SCREEN)
-    title = TITLE_FONT.render("SETTINGS", True, ACCENT)
-    SCREEN.blit(title, title.get_rect(center=(SCREEN_W//2, 80)))
+    blit_bg_with_zoom(runtime.SCREEN, assets.get('background'), 1.06)
+    draw_geometric_overlay(runtime.SCREEN)
+    title = render_text(TITLE_FONT, "SETTINGS", True, ACCENT)
+    runtime.SCREEN.blit(title, title.get_rect(center=(SCREEN_W//2, 80)))
 
     rects = {}
     box_w, box_h = 520, 72
@@ -226,69 +261,70 @@ def draw_settings_menu(mouse_pos,settings_anim,settings):
         if glow_alpha > 0:
             glow_surf = pygame.Surface((box_rect.w+20, box_rect.h+20), pygame.SRCALPHA)
             pygame.draw.rect(glow_surf, (160,255,180,glow_alpha), glow_surf.get_rect(), border_radius=16)
-            SCREEN.blit(glow_surf, (box_rect.x-10, box_rect.y-10), special_flags=pygame.BLEND_PREMULTIPLIED)
+            runtime.SCREEN.blit(glow_surf, (box_rect.x-10, box_rect.y-10), special_flags=pygame.BLEND_PREMULTIPLIED)
 
         bg_color = (
             int(BOX[0] + (HOVER[0]-BOX[0]) * anim_val*0.6),
             int(BOX[1] + (HOVER[1]-BOX[1]) * anim_val*0.6),
             int(BOX[2] + (HOVER[2]-BOX[2]) * anim_val*0.6),
         )
-        pygame.draw.rect(SCREEN, bg_color, box_rect, border_radius=14)
-        pygame.draw.rect(SCREEN, BLACK, box_rect, width=2, border_radius=14)
+        pygame.draw.rect(runtime.SCREEN, bg_color, box_rect, border_radius=14)
+        pygame.draw.rect(runtime.SCREEN, BLACK, box_rect, width=2, border_radius=14)
 
         # icon area
         icon_rect = pygame.Rect(box_rect.x+16, box_rect.centery-22, 44, 44)
-        pygame.draw.rect(SCREEN, (30,30,30), icon_rect, border_radius=10)
-        pygame.draw.rect(SCREEN, ACCENT, icon_rect, 1, border_radius=10)
-        icon_img = MUSIC_ICON if key=="music" else SFX_ICON
+        pygame.draw.rect(runtime.SCREEN, (30,30,30), icon_rect, border_radius=10)
+        pygame.draw.rect(runtime.SCREEN, ACCENT, icon_rect, 1, border_radius=10)
+        icon_img = assets.get("music_icon") if key=="music" else assets.get("sfx_icon")
         if icon_img:
             iw, ih = icon_img.get_size()
             pos = (icon_rect.centerx - iw//2, icon_rect.centery - ih//2)
-            SCREEN.blit(icon_img, pos)
+            runtime.SCREEN.blit(icon_img, pos)
         else:
             # fallback simple icons
             if key=="music":
                 cx, cy = icon_rect.center
                 tri = [(icon_rect.left+8, cy-10),(icon_rect.left+8, cy+10),(icon_rect.left+20, cy)]
-                pygame.draw.polygon(SCREEN, ACCENT, tri)
-                pygame.draw.rect(SCREEN, ACCENT, (icon_rect.left+20, cy-8, 6, 16))
+                pygame.draw.polygon(runtime.SCREEN, ACCENT, tri)
+                pygame.draw.rect(runtime.SCREEN, ACCENT, (icon_rect.left+20, cy-8, 6, 16))
             else:
                 cx, cy = icon_rect.center
-                pygame.draw.line(SCREEN, ACCENT, (icon_rect.left+12, cy-8),(icon_rect.left+12, cy+8),2)
-                pygame.draw.arc(SCREEN, ACCENT, (icon_rect.left+14, cy-12, 18, 24), -1.0, 1.0, 2)
+                pygame.draw.line(runtime.SCREEN, ACCENT, (icon_rect.left+12, cy-8),(icon_rect.left+12, cy+8),2)
+                pygame.draw.arc(runtime.SCREEN, ACCENT, (icon_rect.left+14, cy-12, 18, 24), -1.0, 1.0, 2)
 
         # label
-        label = SETTINGS_FONT.render(key.upper(), True, ACCENT)
-        SCREEN.blit(label, (icon_rect.right + 14, box_rect.centery - label.get_height()//2))
+        label = render_text(SETTINGS_FONT, key.upper(), True, ACCENT)
+        runtime.SCREEN.blit(label, (icon_rect.right + 14, box_rect.centery - label.get_height()//2))
 
         # pill toggle on right (same for music & sfx)
         pill_w, pill_h = 110, 40
         pill_rect = pygame.Rect(box_rect.right - 16 - pill_w, box_rect.centery - pill_h//2, pill_w, pill_h)
         on = bool(settings.get(key, False))
-        pygame.draw.rect(SCREEN, (80,220,120) if on else (80,80,80), pill_rect, border_radius=18)
-        pygame.draw.rect(SCREEN, ACCENT, pill_rect, width=2, border_radius=18)
+        pygame.draw.rect(runtime.SCREEN, (80,220,120) if on else (80,80,80), pill_rect, border_radius=18)
+        pygame.draw.rect(runtime.SCREEN, ACCENT, pill_rect, width=2, border_radius=18)
         knob_x = pill_rect.left + (pill_rect.w - 18) if on else pill_rect.left + 18
         bob = int(4 * anim_val * sin(pygame.time.get_ticks() / 140.0))
         knob_center = (knob_x, pill_rect.centery + bob)
-        pygame.draw.circle(SCREEN, BLACK, knob_center, 12)
-        pygame.draw.circle(SCREEN, ACCENT, (knob_center[0], knob_center[1]), 8)
+        pygame.draw.circle(runtime.SCREEN, BLACK, knob_center, 12)
+        pygame.draw.circle(runtime.SCREEN, ACCENT, (knob_center[0], knob_center[1]), 8)
 
         # store rects for interaction
         rects[key] = {"box": box_rect, "icon": icon_rect, "pill": pill_rect}
 
     # back button
     back_rect = pygame.Rect(SCREEN_W//2 - 80, SCREEN_H - 100, 160, 50)
-    draw_button_scaled(SCREEN, back_rect, "BACK", 0.0)
+    draw_button_scaled(runtime.SCREEN, back_rect, "BACK", 0.0)
     rects["back"] = back_rect
     return {"toggles": rects, "back": back_rect}
 
 
 # Level selector (1..10)
+@tracing.traced('menu')
 def draw_level_selector(mouse_pos,hover_state):
-    blit_bg_with_zoom(SCREEN, BG_IMG, 1.06)
-    draw_geometric_overlay(SCREEN)
-    title = TITLE_FONT.render("SELECT LEVEL", True, ACCENT)
-    SCREEN.blit(title, title.get_rect(center=(SCREEN_W//2, 70)))
+    blit_bg_with_zoom(runtime.SCREEN, assets.get('background'), 1.06)
+    draw_geometric_overlay(runtime.SCREEN)
+    title = render_text(TITLE_FONT, "SELECT LEVEL", True, ACCENT)
+    runtime.SCREEN.blit(title, title.get_rect(center=(SCREEN_W//2, 70)))
 
     level_rects = {}
     cols = 5
@@ -297,7 +333,7 @@ def draw_level_selector(mouse_pos,hover_state):
     start_x = (SCREEN_W - (cols*card_w + (cols-1)*spacing_x)) // 2
     start_y = 160
 
-    num_levels = len(load_levels_dict())
+    num_levels = LEVEL_CATALOG.count()
 
     for i in range(min(10,num_levels)):
         col, row = i % cols, i // cols
@@ -306,10 +342,10 @@ def draw_level_selector(mouse_pos,hover_state):
         rect = pygame.Rect(x,y,card_w,card_h)
         hover = rect.collidepoint(mouse_pos)
         base_color = (28,110,52) if not hover else (68,150,82)
-        pygame.draw.rect(SCREEN, base_color, rect, border_radius=12)
-        pygame.draw.rect(SCREEN, ACCENT, rect, 2, border_radius=12)
-        num = BUTTON_FONT.render(str(i+1), True, ACCENT)
-        SCREEN.blit(num, num.get_rect(center=rect.center))
+        pygame.draw.rect(runtime.SCREEN, base_color, rect, border_radius=12)
+        pygame.draw.rect(runtime.SCREEN, ACCENT, rect, 2, border_radius=12)
+        num = render_text(BUTTON_FONT, str(i+1), True, ACCENT)
+        runtime.SCREEN.blit(num, num.get_rect(center=rect.center))
         level_rects[i+1] = rect
 
     padding = 40
@@ -318,8 +354,8 @@ def draw_level_selector(mouse_pos,hover_state):
     back_rect = pygame.Rect(SCREEN_W//2-padding-back_btn_size[0],SCREEN_H-100,back_btn_size[0],back_btn_size[1])
 
     load_custom_rect = pygame.Rect(SCREEN_W//2-padding+load_custom_btn_size[0]/2,SCREEN_H-100,load_custom_btn_size[0],load_custom_btn_size[1])
-    draw_button_scaled(SCREEN, back_rect, "BACK", 0.0)
-    draw_button_scaled(SCREEN,load_custom_rect , "CUSTOM", 0.0)
+    draw_button_scaled(runtime.SCREEN, back_rect, "BACK", 0.0)
+    draw_button_scaled(runtime.SCREEN,load_custom_rect , "CUSTOM", 0.0)
     return {"levels": level_rects, "back": back_rect,"custom":load_custom_rect}
 
 # update hover states & settings anims (based on base rect positions)
@@ -346,6 +382,13 @@ def update_hover_states(mouse_pos, dt,hover_state,settings,settings_anim):
         cur = settings_anim[key]
         settings_anim[key] = cur + (target - cur) * min(1.0, ANIM_SPEED * dt)
 
+""" Loads what catalog.load_level_file gave back (a level dict or a BinaryLevel) into `level` """
+def load_level_contents(level,contents):
+    if isinstance(contents,BinaryLevel):
+        level.from_binary(contents)
+    else:
+        level.from_dict(contents)
+
 class SelectedLevelType(Enum):
     Premade=1,
     Custom=2
@@ -354,23 +397,30 @@ class SelectedLevel:
     def __init__(self,ty:SelectedLevelType,val):
         self.val = val
         self.type = ty
-    def to_level(self):
-        match self.type:
-            case SelectedLevelType.Premade:
-                idx = self.val-1 if self.val > 0  else 0 
-                level_dict = LEVELS_DICTS[idx] 
-                level = LEVEL_0
-                level.from_dict(level_dict)
-                level.level_num = self.val
-                level.is_premade = True
-                return level
-            case SelectedLevelType.Custom:
-                import json
-                with open(self.val,'r') as f:
-                    contents = f.read()
-                    contents = json.loads(contents)
-                    level = LEVEL_0
-                    level.from_dict(contents)
+    """
+        Loads the level into a Level of its own, so it can be built on the loader thread while another level is still on screen.
+        RETURNS None if the level file couldnt be loaded
+    """
+    def build_level(self):
+        with tracing.span('load level','load',level=str(self.val)):
+            level = Level(runtime.SCREEN,(0,0),(0,0),[])
+            match self.type:
+                case SelectedLevelType.Premade:
+                    idx = self.val-1 if self.val > 0  else 0 
+                    if idx >= LEVEL_CATALOG.count(): return None
+                    contents = LEVEL_CATALOG.get(idx)
+                    if contents is None: return None
+                    load_level_contents(level,contents)
+                    level.level_num = self.val
+                    level.is_premade = True
+                    return level
+                case SelectedLevelType.Custom:
+                    try:
+                        contents = load_level_file(self.val)
+                    except (OSError,ValueError) as e:
+                        print('Could not load level {}: {}'.format(self.val,e))
+                        return None
+                    load_level_contents(level,contents)
                     return level
  
     def next_level(self):
@@ -0,0 +1,219 @@
+"""
+    Headless simulation core.
+    Nothing in here touches the display or the mixer, so a level can be stepped in a test, a worker process or a batch job
+    as fast as the CPU allows. Rendering and audio hook in by subscribing to the events emitted while stepping.
+"""
+
+import math
+import pygame
+from enum import Enum
+
+from constants import *
+import tracing
+
+
+class PhysicsEvent(Enum):
+    # The ball was shot (args: ball)
+    Shot = 1
+    # The ball bounced off an object (args: ball, obj)
+    Bounce = 2
+    # The ball reached the hole (args: ball)
+    Holed = 3
+
+
+class EventBus:
+    def __init__(self):
+        self.listeners = {}
+
+    def subscribe(self,event:PhysicsEvent,callback):
+        callbacks = self.listeners.setdefault(event,[])
+        # subscribing twice is a no-op, levels get reused so this happens a lot
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def unsubscribe(self,event:PhysicsEvent,callback):
+        callbacks = self.listeners.get(event) or []
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def emit(self,event:PhysicsEvent,*args):
+        for callback in self.listeners.get(event) or []:
+            callback(*args)
+
+
+def hole_rect(ball_end) -> pygame.Rect:
+    return pygame.Rect(ball_end[0],ball_end[1],HOLE_RADIUS,HOLE_RADIUS)
+
+def is_holed(ball,ball_end) -> bool:
+    return ball.rect.colliderect(hole_rect(ball_end))
+
+""" The part of the level the ball can touch this frame, whichever way it bounces """
+def swept_rect(ball) -> pygame.Rect:
+    # the ball never travels further than its velocity in one frame.
+    # +2 covers the rect being rounded and touching a block (which counts as a hit) being one pixel outside of it
+    reach = int(abs(ball.velocity)) + 2
+    return ball.rect.inflate(2*reach,2*reach)
+
+""" First t in [0,1] where the point (cx,cy)+(dx,dy)*t is `radius` away from (kx,ky), or None """
+def ray_circle(cx,cy,dx,dy,kx,ky,radius):
+    fx,fy = cx-kx,cy-ky
+    a = dx*dx + dy*dy
+    b = 2*(fx*dx + fy*dy)
+    c = fx*fx + fy*fy - radius*radius
+    disc = b*b - 4*a*c
+    if a == 0 or disc < 0: return None
+    t = (-b - math.sqrt(disc)) / (2*a)
+    if t < 0 or t > 1: return None
+    return t
+
+"""
+    Time of impact of a circle at (cx,cy) moving by (dx,dy) against a rect.
+    RETURNS (t,nx,ny) where t in [0,1] is how far along the move it touches and (nx,ny) is the normal of the surface it hits,
+    or None if it doesnt hit. A circle already touching the rect only counts if it is moving further into it.
+"""
+def sweep_circle_rect(cx,cy,radius,dx,dy,rect):
+    if rect.w <= 0 or rect.h <= 0: return None
+    left,top,right,bottom = rect.left,rect.top,rect.right,rect.bottom
+
+    # closest point of the rect to the center
+    qx = min(max(cx,left),right)
+    qy = min(max(cy,top),bottom)
+    ox,oy = cx-qx,cy-qy
+    dist2 = ox*ox + oy*oy
+    if dist2 <= radius*radius:
+        if dist2 > 0:
+            dist = math.sqrt(dist2)
+            nx,ny = ox/dist,oy/dist
+        else:
+            # the center is inside the rect, push out through the closest side
+            nx,ny,pen = -1.0,0.0,cx-left
+            if right-cx < pen: nx,ny,pen = 1.0,0.0,right-cx
+            if cy-top < pen: nx,ny,pen = 0.0,-1.0,cy-top
+            if bottom-cy < pen: nx,ny,pen = 0.0,1.0,bottom-cy
+        if dx*nx + dy*ny < 0:
+            return 0.0,nx,ny
+        return None
+
+    # slab test against the rect grown by the radius on every side
+    t_enter,t_exit = 0.0,1.0
+    nx,ny = 0.0,0.0
+    if dx == 0:
+        if cx < left-radius or cx > right+radius: return None
+    else:
+        t0,t1,n = (left-radius-cx)/dx,(right+radius-cx)/dx,-1.0
+        if t0 > t1: t0,t1,n = t1,t0,1.0
+        if t0 > t_enter: t_enter,nx,ny = t0,n,0.0
+        if t1 < t_exit: t_exit = t1
+    if dy == 0:
+        if cy < top-radius or cy > bottom+radius: return None
+    else:
+        t0,t1,n = (top-radius-cy)/dy,(bottom+radius-cy)/dy,-1.0
+        if t0 > t1: t0,t1,n = t1,t0,1.0
+        if t0 > t_enter: t_enter,nx,ny = t0,0.0,n
+        if t1 < t_exit: t_exit = t1
+    if t_enter > t_exit: return None
+
+    # the grown rect has square corners but the real shape has round ones, so near a corner hit the corner circle instead
+    px,py = cx + dx*t_enter,cy + dy*t_enter
+    kx = left if px < left else right if px > right else None
+    ky = top if py < top else bottom if py > bottom else None
+    if kx is not None and ky is not None:
+        t = ray_circle(cx,cy,dx,dy,kx,ky,radius)
+        if t is None: return None
+        hx,hy = cx + dx*t - kx,cy + dy*t - ky
+        dist = math.sqrt(hx*hx + hy*hy)
+        return t,hx/dist,hy/dist
+    if nx == 0 and ny == 0:
+        # only grazing the side we started next to
+        return None
+    return t_enter,nx,ny
+
+def sync_ball_pos(ball):
+    # The rect only holds whole pixels, so the real position is kept in ball.pos.
+    # If someone moved the rect themselves (win animation, reset ...) we start again from there
+    if ball.rect.topleft != ball.synced_topleft:
+        ball.pos = pygame.math.Vector2(ball.rect.topleft)
+
+def set_ball_pos(ball,x,y):
+    ball.pos = pygame.math.Vector2(x,y)
+    ball.rect.x = x
+    ball.rect.y = y
+    ball.synced_topleft = ball.rect.topleft
+
+"""
+    Moves the ball by one frame, bouncing it off `objects` (anything with a rect() method).
+    Instead of checking where the ball ends up, we sweep its circle along the whole move, stop at the earliest block it touches,
+    reflect the direction off that surface and carry on with whatever distance is left. That way a fast ball cant skip through thin walls.
+"""
+def step_ball(ball,objects,events:EventBus=None,grid=None):
+    with tracing.span('step_ball','physics'):
+        sweep_ball(ball,objects,events,grid)
+
+def sweep_ball(ball,objects,events:EventBus=None,grid=None):
+    sync_ball_pos(ball)
+    # With a broadphase grid we only look at the blocks around the ball, in the same order as the level lists them
+    if grid is not None:
+        objects = grid.query(swept_rect(ball))
+
+    radius = ball.rect.w / 2
+    cx,cy = ball.pos.x + radius,ball.pos.y + radius
+    dx,dy = ball.dir.x,ball.dir.y
+    remaining = ball.velocity
+    for _ in range(MAX_BOUNCES_PER_STEP + 1):
+        mx,my = dx*remaining,dy*remaining
+        best,best_obj = None,None
+        for obj in objects:
+            hit = sweep_circle_rect(cx,cy,radius,mx,my,obj.rect())
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best,best_obj = hit,obj
+        if best is None:
+            cx += mx
+            cy += my
+            break
+        t,nx,ny = best
+        cx += mx*t
+        cy += my*t
+        dot = dx*nx + dy*ny
+        dx -= 2*dot*nx
+        dy -= 2*dot*ny
+        remaining *= (1-t)
+        if events: events.emit(PhysicsEvent.Bounce,ball,best_obj)
+
+    ball.dir = pygame.math.Vector2(dx,dy)
+    set_ball_pos(ball,cx - radius,cy - radius)
+    apply_friction(ball)
+
+""" Moves the ball without checking for collisions """
+def move_ball(ball):
+    sync_ball_pos(ball)
+    set_ball_pos(ball,ball.pos.x + ball.velocity * ball.dir.x,ball.pos.y + ball.velocity * ball.dir.y)
+    apply_friction(ball)
+
+def apply_friction(ball):
+    if abs(ball.velocity) > 1:
+        ball.velocity -= FRICTION * -1 if ball.velocity < 0 else 1
+    else:
+        ball.velocity = 0
+
+""" Advances the ball and every block by one frame """
+def step(ball,objects,events:EventBus=None,grid=None):
+    step_ball(ball,objects,events,grid)
+    for obj in objects:
+        obj.update()
+    if grid is not None:
+        for obj in grid.dynamic:
+            grid.move(obj,obj.rect())
+
+"""
+    Steps until the ball comes to rest or drops into the hole, without any frame cap.
+    RETURNS (number of frames stepped, whether the ball was holed)
+"""
+def simulate(ball,objects,ball_end,max_frames:int=10_000,events:EventBus=None,grid=None):
+    for frame in range(max_frames):
+        if is_holed(ball,ball_end):
+            if events: events.emit(PhysicsEvent.Holed,ball)
+            return frame,True
+        if not ball.is_moving():
+            return frame,False
+        step(ball,objects,events,grid)
+    return max_frames,is_holed(ball,ball_end)
@@ -0,0 +1,125 @@
+"""
+    Trajectory preview while aiming.
+    A ghost ball is shot with the same angle and power the player is aiming with and stepped headlessly (physics.step_ball against
+    the level's baked blocks and broadphase grid) until it has bounced PREVIEW_BOUNCES times, stopped or dropped in.
+    Angle and power are quantized so small mouse movements hit the same cached path, and a path that doesnt fit into
+    PREVIEW_FRAME_BUDGET is carried on over the next frames instead of holding one up.
+"""
+
+import math
+import time
+from collections import OrderedDict
+
+import pygame
+
+from constants import *
+import physics
+from physics import PhysicsEvent
+from ball import Ball
+
+
+""" (angle step, power step) for an aim from `initial_pos` to `final_pos`, None when there is nothing to shoot """
+def shot_key(initial_pos,final_pos):
+    dx = initial_pos[0] - final_pos[0]
+    dy = initial_pos[1] - final_pos[1]
+    power = min(math.hypot(dx,dy),MAX_VELOCITY)
+    if power == 0: return None
+    angle = math.degrees(math.atan2(dy,dx))
+    return round(angle / PREVIEW_ANGLE_STEP) % round(360 / PREVIEW_ANGLE_STEP),max(1,round(power / PREVIEW_POWER_STEP))
+
+
+""" One ghost shot being stepped, possibly over several frames """
+class PathTrace:
+    def __init__(self,level,start,key):
+        self.level = level
+        angle = math.radians(key[0] * PREVIEW_ANGLE_STEP)
+        # same as Ball.calc_force, with the quantized angle and power
+        self.ball = Ball(None,0,0)
+        physics.set_ball_pos(self.ball,start[0],start[1])
+        self.ball.dir = pygame.math.Vector2(math.cos(angle),math.sin(angle))
+        self.ball.velocity = min(key[1] * PREVIEW_POWER_STEP,MAX_VELOCITY) * 0.1
+        self.ball.events.subscribe(PhysicsEvent.Bounce,self.on_bounce)
+        self.bounces = 0
+        self.steps = 0
+        self.points = [self.center()]
+        self.done = False
+
+    def center(self):
+        radius = self.ball.rect.w / 2
+        return self.ball.pos.x + radius,self.ball.pos.y + radius
+
+    def on_bounce(self,ball,obj):
+        self.bounces += 1
+
+    """ Steps the ghost ball until the path is finished or `deadline` (a time.perf_counter() value) passed. RETURNS whether it is finished """
+    def advance(self,deadline:float) -> bool:
+        level = self.level
+        while not self.done:
+            physics.step_ball(self.ball,level.baked_objects,self.ball.events,level.grid)
+            self.steps += 1
+            self.points.append(self.center())
+            if (self.bounces >= PREVIEW_BOUNCES or not self.ball.is_moving() or self.steps >= PREVIEW_MAX_STEPS
+                    or physics.is_holed(self.ball,level.ball_end)):
+                self.done = True
+            elif self.steps % 8 == 0 and time.perf_counter() >= deadline:
+                break
+        return self.done
+
+
+class TrajectoryPreview:
+    def __init__(self,level):
+        self.level = level
+        # shot key -> finished path (list of ball centers), the least recently used ones get dropped
+        self.cache = OrderedDict()
+        # where the ball and the moving blocks were when the cached paths were made
+        self.geometry = None
+        # (shot key, PathTrace) being worked on
+        self.pending = None
+        # the last finished path and its key, shown while the path for the current geometry is still being worked on
+        self.shown = None
+        self.shown_key = None
+
+    def geometry_key(self) -> tuple:
+        ball = self.level.ball
+        # see physics.sync_ball_pos
+        start = (ball.pos.x,ball.pos.y) if ball.rect.topleft == ball.synced_topleft else ball.rect.topleft
+        return (start,) + tuple(tuple(obj.inner.rect) for obj in self.level.moving_objects)
+
+    """ RETURNS the ball centers along the predicted path of the shot being aimed, or None """
+    def path(self,initial_pos,final_pos):
+        key = shot_key(initial_pos,final_pos)
+        if key is None: return None
+        geometry = self.geometry_key()
+        if geometry != self.geometry:
+            # blocks moved or the ball did, none of the paths are right anymore.
+            # A path being worked on carries on against the blocks where they are now, unless the ball itself moved
+            if self.geometry is None or geometry[0] != self.geometry[0]:
+                self.pending = None
+                self.shown = self.shown_key = None
+            self.cache.clear()
+            self.geometry = geometry
+        points = self.cache.get(key)
+        if points is not None:
+            self.cache.move_to_end(key)
+            return points
+
+        if self.pending is None or self.pending[0] != key:
+            self.pending = (key,PathTrace(self.level,geometry[0],key))
+        trace = self.pending[1]
+        if trace.advance(time.perf_counter() + PREVIEW_FRAME_BUDGET):
+            self.pending = None
+            self.cache[key] = trace.points
+            while len(self.cache) > PREVIEW_CACHE_SIZE:
+                self.cache.popitem(last=False)
+            self.shown,self.shown_key = trace.points,key
+            return trace.points
+        # not finished yet, keep showing the last finished path for this aim until it is
+        if self.shown_key == key:
+            return self.shown
+        return trace.points
+
+    """ Draws the predicted path. RETURNS the rect it drew over, or None """
+    def draw(self,surface,initial_pos,final_pos):
+        points = self.path(initial_pos,final_pos)
+        if points is None or len(points) < 2: return None
+        return pygame.draw.lines(surface,PREVIEW_COLOR,False,points,2)
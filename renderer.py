@@ -0,0 +1,72 @@
+"""
+    Gameplay rendering.
+    Almost nothing on screen changes while a level is being played, so instead of clearing and redrawing the whole level
+    every frame we draw the static blocks and the hole once into a layer, and each frame only put back and redraw the few
+    rects that the ball, the moving blocks, the aiming arrow and the stroke counter cover.
+"""
+
+import pygame
+
+from constants import *
+import frameprofiler
+
+
+class GameplayRenderer:
+    def __init__(self,level,screen):
+        self.level = level
+        self.screen = screen
+        self.static_layer = None
+        # the baked blocks the layer was drawn from, a level that gets loaded again in place bakes new ones
+        self.baked_objects = None
+        # the rects we drew dynamic things into last frame, they get restored from the static layer before drawing again
+        self.prev_rects = []
+        self.full_redraw = True
+
+    """ Draws the background, static blocks and hole into a surface the size of the screen """
+    def build_static_layer(self):
+        layer = pygame.Surface(self.screen.get_size()).convert()
+        layer.fill(BG_COLOR)
+        self.level.draw_static(layer)
+        self.static_layer = layer
+        self.baked_objects = self.level.baked_objects
+
+    """ Forces the next draw to put the whole screen up again (window exposed, something else drew over us ...) """
+    def invalidate(self):
+        self.full_redraw = True
+
+    """
+        Draws one frame of the level onto the screen.
+        RETURNS the list of rects that changed, to be passed to pygame.display.update
+    """
+    def draw(self,interpolation:float=1.0) -> list:
+        level = self.level
+        if self.static_layer is None or self.baked_objects is not level.baked_objects:
+            self.build_static_layer()
+            self.full_redraw = True
+
+        if self.full_redraw:
+            self.screen.blit(self.static_layer,(0,0))
+            dirty = [self.screen.get_rect()]
+            self.full_redraw = False
+        else:
+            for rect in self.prev_rects:
+                self.screen.blit(self.static_layer,rect,rect)
+            dirty = list(self.prev_rects)
+
+        drawn = []
+        aim = level.draw_aim()
+        if aim is not None:
+            drawn.append(aim)
+        for obj in level.moving_objects:
+            drawn.append(obj.draw(interpolation))
+        drawn.append(level.ball.draw(interpolation))
+        drawn.append(level.draw_hud())
+        frameprofiler.count('Ball','draw')
+        frameprofiler.count('MovingBlock','draw',len(level.moving_objects))
+
+        # pygame.draw rects can reach a pixel past the screen, keep them inside so the restore blits line up
+        screen_rect = self.screen.get_rect()
+        drawn = [rect.clip(screen_rect) for rect in drawn]
+        self.prev_rects = drawn
+        dirty.extend(drawn)
+        return dirty
@@ -0,0 +1,160 @@
+"""
+    Shot recording and headless replay.
+    While recording, every shot is saved as the frame it was taken on plus the two mouse positions handed to Ball.calc_force,
+    and every frame gets a checksum of the ball and moving block state. The replayer loads the same level, feeds the shots back in
+    on the same frames without a window and as fast as the CPU allows, and checks that every frame comes out bit for bit the same.
+
+        python main.py --record sessions.jsonl            play, every level played is appended as one recording
+        python replay.py sessions.jsonl                   replay them all, report the first frame that differs
+        python replay.py sessions.jsonl --repeat 20       same, but as a physics benchmark
+
+    The exit code is 1 if any recording doesnt replay exactly, so it can guard changes to Ball.update or MovingBlock.update.
+"""
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+from dataclasses import dataclass
+
+from level import LevelState
+
+RECORDING_VERSION = 1
+
+BALL_STATE = struct.Struct('<5dB')
+BLOCK_STATE = struct.Struct('<4iH')
+
+
+""" sha1 of what the level is made of (not where the ball currently is), so a replay can tell it got a different level """
+def level_content_hash(level) -> str:
+    d = level.to_dict()
+    d.pop('ball',None)
+    return hashlib.sha1(json.dumps(d,sort_keys=True,separators=(',',':')).encode()).hexdigest()
+
+""" crc32 of the exact ball position, velocity and direction and of every moving block """
+def state_checksum(level) -> int:
+    ball = level.ball
+    crc = zlib.crc32(BALL_STATE.pack(ball.pos.x,ball.pos.y,ball.velocity,ball.dir.x,ball.dir.y,level.state.value))
+    for obj in level.moving_objects:
+        inner = obj.inner
+        crc = zlib.crc32(BLOCK_STATE.pack(inner.rect.x,inner.rect.y,inner.rect.w,inner.rect.h,inner.current_checkpoint),crc)
+    return crc
+
+
+"""
+    Records one level. Hang it on Level.recorder right after the level was loaded, the level calls shot() and frame()
+    and to_dict() gives the recording
+"""
+class ShotRecorder:
+    def __init__(self,level,level_ref:dict):
+        # how to load the level again, {'premade': level number} or {'path': file}
+        self.level_ref = level_ref
+        self.content_hash = level_content_hash(level)
+        # (frame, mouse_initial_pos, mouse_final_pos)
+        self.shots = []
+        self.checksums = []
+
+    def shot(self,level,initial_pos,final_pos):
+        self.shots.append((level.frame,tuple(initial_pos),tuple(final_pos)))
+
+    def frame(self,level):
+        self.checksums.append(state_checksum(level))
+
+    def to_dict(self) -> dict:
+        return {
+            'version':RECORDING_VERSION,
+            'level':self.level_ref,
+            'content_hash':self.content_hash,
+            'shots':[[frame,list(initial_pos),list(final_pos)] for frame,initial_pos,final_pos in self.shots],
+            'checksums':self.checksums,
+        }
+
+""" Appends the recording as one line of `path` """
+def save_recording(path:str,recording:dict):
+    with open(path,'a') as f:
+        f.write(json.dumps(recording,separators=(',',':')) + '\n')
+
+def load_recordings(path:str) -> list:
+    with open(path,'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+""" Loads the level a recording was made on, the same way the menu does. RETURNS None if it cant be loaded """
+def load_recorded_level(level_ref:dict):
+    from main_menu import SelectedLevel, SelectedLevelType
+    if 'premade' in level_ref:
+        return SelectedLevel(SelectedLevelType.Premade,level_ref['premade']).build_level()
+    return SelectedLevel(SelectedLevelType.Custom,level_ref['path']).build_level()
+
+@dataclass
+class ReplayResult:
+    frames: int
+    # first frame whose state didnt match the recording, None if they all did
+    mismatch: int
+    seconds: float
+    holed: bool
+
+"""
+    Plays a recording back on `level` (freshly loaded, see load_recorded_level).
+    Stops at the first frame that differs unless `stop_at_mismatch` is off
+"""
+def replay(recording:dict,level,stop_at_mismatch:bool=True) -> ReplayResult:
+    shots = {}
+    for frame,initial_pos,final_pos in recording['shots']:
+        shots.setdefault(frame,[]).append((initial_pos,final_pos))
+    checksums = recording['checksums']
+    mismatch = None
+
+    t = time.perf_counter()
+    for frame,expected in enumerate(checksums):
+        for initial_pos,final_pos in shots.get(frame,()):
+            level.shoot(initial_pos,final_pos)
+        level.update()
+        if mismatch is None and state_checksum(level) != expected:
+            mismatch = frame
+            if stop_at_mismatch: break
+    seconds = time.perf_counter() - t
+    return ReplayResult(frame+1 if checksums else 0,mismatch,seconds,level.state == LevelState.WON)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Replays recorded shots headlessly and checks every frame against the recording')
+    parser.add_argument('recordings',help='file written by main.py --record')
+    parser.add_argument('--repeat',type=int,default=1,help='replay every recording this many times and report frames per second')
+    args = parser.parse_args()
+
+    failed = False
+    for i,recording in enumerate(load_recordings(args.recordings)):
+        name = '#{} {}'.format(i,json.dumps(recording['level']))
+        if recording.get('version') != RECORDING_VERSION:
+            print(name,'unsupported recording version',recording.get('version'))
+            failed = True
+            continue
+        frames = seconds = 0
+        for _ in range(args.repeat):
+            level = load_recorded_level(recording['level'])
+            if level is None:
+                print(name,'level could not be loaded')
+                failed = True
+                break
+            if level_content_hash(level) != recording['content_hash']:
+                print(name,'level changed since it was recorded')
+                failed = True
+                break
+            result = replay(recording,level)
+            if result.mismatch is not None:
+                print(name,'MISMATCH at frame',result.mismatch)
+                failed = True
+                break
+            frames += result.frames
+            seconds += result.seconds
+        else:
+            print('{} OK  {} frames, {} shots, {:.0f} frames/s'.format(name,len(recording['checksums']),len(recording['shots']),frames / seconds if seconds else 0))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,8 @@
+"""
+    What only exists once the game has started: the window and the clock.
+    main.init() fills these in. Modules read them from here when they need them (runtime.SCREEN) rather than importing them
+    from main, so importing a module never opens a window or depends on main having been imported first.
+"""
+
+SCREEN = None
+CLOCK = None
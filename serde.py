@@ -29,3 +29,220 @@ def vector2_to_dict(v):
     d['y'] = v.y
     return d
 
+
+
+"""
+    Binary levels.
+    JSON levels store every block as {"inner": {"rect": {"x":..}}} and cost a dict per field to load. The binary format stores the same
+    level as a fixed header followed by flat packed arrays, so it can be memory mapped and read in place without copying or parsing.
+
+    Layout (little endian, every array starts on a 4 byte boundary):
+        header               LEVEL_HEADER
+        rects                int16   [n_objects * 4]      x,y,w,h of every block, in level order
+        moving_objects       uint32  [n_moving]           which blocks are MovingBlocks
+        checkpoint_offsets   uint32  [n_moving + 1]       moving block i has checkpoints[offsets[i]:offsets[i+1]]
+        speeds               float32 [n_moving]
+        current_checkpoints  uint16  [n_moving]
+        checkpoints          float32 [n_checkpoints * 2]  x,y pairs
+    The ball's own state isnt stored, levels always start with the ball resting on ball_start.
+"""
+import struct
+import sys
+
+LEVEL_MAGIC = b'SYSL'
+LEVEL_VERSION = 1
+# magic, version, header size, ball start x/y, ball end x/y, number of blocks, number of moving blocks, number of checkpoints
+LEVEL_HEADER = struct.Struct('<4sHHffffIII')
+
+""" RETURNS ([(name,struct format char,count,offset)],total size) for a level with these counts """
+def binary_layout(n_objects,n_moving,n_checkpoints):
+    arrays = [
+        ('rects','h',n_objects*4),
+        ('moving_objects','I',n_moving),
+        ('checkpoint_offsets','I',n_moving+1),
+        ('speeds','f',n_moving),
+        ('current_checkpoints','H',n_moving),
+        ('checkpoints','f',n_checkpoints*2),
+    ]
+    layout = []
+    offset = LEVEL_HEADER.size
+    for name,fmt,count in arrays:
+        offset = (offset + 3) & ~3
+        layout.append((name,fmt,count,offset))
+        offset += struct.calcsize(fmt)*count
+    return layout,offset
+
+def is_binary_level(data) -> bool:
+    return bytes(data[:len(LEVEL_MAGIC)]) == LEVEL_MAGIC
+
+def _is_moving_dict(inner) -> bool:
+    # same rule Block.from_dict uses
+    return bool(inner.get('checkpoints') or inner.get('current_checkpoint') or inner.get('speed'))
+
+def _to_int16(v):
+    if not -32768 <= v <= 32767:
+        raise ValueError('block coordinate {} does not fit the binary level format'.format(v))
+    return v
+
+""" Packs a level dict (as stored in the JSON level files) into the binary format. RETURNS bytes """
+def level_dict_to_binary(dict_) -> bytes:
+    start = dict_.get('ball_start') or (0,0)
+    end = dict_.get('ball_end') or (10,10)
+    rects = []
+    moving_objects = []
+    checkpoint_offsets = [0]
+    speeds = []
+    current_checkpoints = []
+    checkpoints = []
+    for i,obj in enumerate(dict_.get('objects') or []):
+        inner = obj.get('inner')
+        if inner is None:
+            raise ValueError('object {} has no block'.format(i))
+        rect = rect_from_dict(inner.get('rect'))
+        rects.extend(_to_int16(v) for v in (rect.x,rect.y,rect.w,rect.h))
+        if _is_moving_dict(inner):
+            moving_objects.append(i)
+            for d in inner.get('checkpoints') or []:
+                v = vector2_from_dict(d)
+                checkpoints.extend((v.x,v.y))
+            checkpoint_offsets.append(len(checkpoints)//2)
+            speeds.append(inner.get('speed') or 0)
+            current_checkpoints.append(inner.get('current_checkpoint') or 0)
+
+    values = {
+        'rects':rects,
+        'moving_objects':moving_objects,
+        'checkpoint_offsets':checkpoint_offsets,
+        'speeds':speeds,
+        'current_checkpoints':current_checkpoints,
+        'checkpoints':checkpoints,
+    }
+    n_objects,n_moving,n_checkpoints = len(rects)//4,len(moving_objects),len(checkpoints)//2
+    layout,size = binary_layout(n_objects,n_moving,n_checkpoints)
+    buf = bytearray(size)
+    LEVEL_HEADER.pack_into(buf,0,LEVEL_MAGIC,LEVEL_VERSION,LEVEL_HEADER.size,start[0],start[1],end[0],end[1],n_objects,n_moving,n_checkpoints)
+    for name,fmt,count,offset in layout:
+        struct.pack_into('<{}{}'.format(count,fmt),buf,offset,*values[name])
+    return bytes(buf)
+
+def _number(v):
+    # coordinates go through float32, give back ints for the ones that were ints
+    return int(v) if float(v).is_integer() else v
+
+"""
+    A level in the binary format, read in place from `buffer` (bytes, or an mmap to avoid copying the file).
+    The arrays are memoryviews into the buffer, so the buffer has to stay open for as long as they are used
+"""
+class BinaryLevel:
+    def __init__(self,buffer):
+        if len(buffer) < LEVEL_HEADER.size or not is_binary_level(buffer):
+            raise ValueError('not a binary level')
+        magic,version,header_size,sx,sy,ex,ey,n_objects,n_moving,n_checkpoints = LEVEL_HEADER.unpack_from(buffer,0)
+        if version != LEVEL_VERSION:
+            raise ValueError('unsupported binary level version {}'.format(version))
+        if header_size != LEVEL_HEADER.size:
+            raise ValueError('bad binary level header size {}'.format(header_size))
+        layout,size = binary_layout(n_objects,n_moving,n_checkpoints)
+        if len(buffer) < size:
+            raise ValueError('binary level is truncated ({} of {} bytes)'.format(len(buffer),size))
+
+        self.buffer = buffer
+        self.ball_start = (_number(sx),_number(sy))
+        self.ball_end = (_number(ex),_number(ey))
+        self.n_objects = n_objects
+        self.n_moving = n_moving
+        self.n_checkpoints = n_checkpoints
+        view = memoryview(buffer)
+        for name,fmt,count,offset in layout:
+            nbytes = struct.calcsize(fmt)*count
+            if sys.byteorder == 'little':
+                arr = view[offset:offset+nbytes].cast(fmt)
+            else:
+                # the file's bytes cant be used as they are on a big endian machine, this one copy is the price
+                values = struct.unpack_from('<{}{}'.format(count,fmt),buffer,offset)
+                arr = memoryview(struct.pack('={}{}'.format(count,fmt),*values)).cast(fmt)
+            setattr(self,name,arr)
+
+    def rect(self,i) -> tuple:
+        r = self.rects
+        return r[4*i],r[4*i+1],r[4*i+2],r[4*i+3]
+
+    """ RETURNS {object index: moving block index} """
+    def moving_index(self) -> dict:
+        return {obj_i:i for i,obj_i in enumerate(self.moving_objects)}
+
+    def checkpoints_of(self,moving_i) -> list:
+        c = self.checkpoints
+        a,b = self.checkpoint_offsets[moving_i],self.checkpoint_offsets[moving_i+1]
+        return [(c[2*k],c[2*k+1]) for k in range(a,b)]
+
+    """ The same level as a JSON level dict """
+    def to_dict(self):
+        moving = self.moving_index()
+        objects = []
+        for i in range(self.n_objects):
+            x,y,w,h = self.rect(i)
+            inner = {'rect':{'x':x,'y':y,'w':w,'h':h}}
+            m = moving.get(i)
+            if m is not None:
+                inner['checkpoints'] = [{'x':_number(cx),'y':_number(cy)} for cx,cy in self.checkpoints_of(m)]
+                inner['current_checkpoint'] = self.current_checkpoints[m]
+                inner['speed'] = _number(self.speeds[m])
+            objects.append({'inner':inner})
+        return {'ball_start':list(self.ball_start),'ball_end':list(self.ball_end),'objects':objects}
+
+    """ Drops the views into the buffer so an mmap under it can be closed """
+    def release(self):
+        for name,_,_,_ in binary_layout(0,0,0)[0]:
+            arr = getattr(self,name,None)
+            if arr is not None:
+                arr.release()
+                setattr(self,name,None)
+
+def level_dict_from_binary(data) -> dict:
+    level = BinaryLevel(data)
+    d = level.to_dict()
+    level.release()
+    return d
+
+"""
+    Parses level file contents in either format. RETURNS a level dict (JSON) or a BinaryLevel reading straight from `data`.
+    Raises ValueError if it isnt a level
+"""
+def parse_level(data):
+    if is_binary_level(data):
+        return BinaryLevel(data)
+    import json
+    level_dict = json.loads(bytes(data))
+    if not isinstance(level_dict,dict):
+        raise ValueError('expected a level object, got {}'.format(type(level_dict).__name__))
+    return level_dict
+
+"""
+    Memory maps a binary level file. RETURNS a BinaryLevel whose arrays point straight into the mapped file.
+    The mapping stays open until the BinaryLevel (and everything using its arrays) is gone
+"""
+def load_binary_level(path) -> BinaryLevel:
+    import mmap
+    with open(path,'rb') as file:
+        mapped = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+    return BinaryLevel(mapped)
+
+
+""" Converts level files between JSON and the binary format: python serde.py to-binary|to-json IN OUT """
+if __name__ == '__main__':
+    import json
+    if len(sys.argv) != 4 or sys.argv[1] not in ('to-binary','to-json'):
+        print('usage: python serde.py to-binary|to-json IN OUT')
+        sys.exit(1)
+    _,mode,src,dst = sys.argv
+    if mode == 'to-binary':
+        with open(src,'r') as f:
+            data = level_dict_to_binary(json.loads(f.read()))
+        with open(dst,'wb') as f:
+            f.write(data)
+    else:
+        with open(src,'rb') as f:
+            d = level_dict_from_binary(f.read())
+        with open(dst,'w') as f:
+            json.dump(d,f)
@@ -0,0 +1,190 @@
+"""
+    Par solver.
+    Searches for the fewest strokes that get the ball from ball_start into the hole, trying every shot on a grid of
+    SOLVER_ANGLES angles x SOLVER_POWERS powers from each position. It is a beam search: every stroke, each kept position gets
+    all the shots simulated with batch.simulate_shots, spread over a multiprocessing pool. Positions within SOLVER_EPSILON pixels
+    of one already seen are dropped, and only the SOLVER_BEAM_WIDTH positions closest to the hole go on to the next stroke.
+
+        python solver.py levels/3.py                      minimum strokes, the shots and a recommended par
+        python solver.py my_level.json --workers 8 --beam 128
+
+    The result is the minimum within that grid and beam, a human with a mouse can do at best as well.
+    The next shot is assumed to be taken on the frame the ball stops, which only matters for levels with moving blocks.
+"""
+
+import os
+import math
+import time
+import multiprocessing
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from constants import *
+from batch import simulate_shots, BatchLevel
+from serde import BinaryLevel
+
+
+@dataclass
+class SolveResult:
+    # fewest strokes found, None if no shot sequence within max_strokes holes the ball
+    strokes: int
+    # (angle in degrees, power) of every stroke, in the format batch.simulate_shots takes
+    shots: list = field(default_factory=list)
+    # recommended par, see recommend_par
+    par: int = None
+    # how many shots of the grid hole the ball from the position before the last stroke
+    holing_shots: int = 0
+    # number of shots simulated and how long it took
+    simulated: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class SearchState:
+    # exact top left of the ball (Ball.pos, not rounded to the rect)
+    pos: tuple
+    # frames since the level started, for where the moving blocks are
+    frame: int
+    # shots that got here
+    shots: tuple
+
+
+""" (angles*powers, 2) array of (angle in degrees, power), powers spread evenly up to MAX_VELOCITY """
+def shot_grid(angles:int=SOLVER_ANGLES,powers:int=SOLVER_POWERS) -> np.ndarray:
+    a = np.arange(angles) * (360 / angles)
+    p = np.arange(1,powers+1) * (MAX_VELOCITY / powers)
+    return np.stack(np.meshgrid(a,p,indexing='ij'),axis=-1).reshape(-1,2)
+
+""" A level dict from a level dict, a Level, a serde.BinaryLevel or the path of a level file """
+def level_dict_of(level) -> dict:
+    if isinstance(level,dict): return level
+    if isinstance(level,BinaryLevel): return level.to_dict()
+    if isinstance(level,str):
+        from catalog import load_level_file
+        return level_dict_of(load_level_file(level))
+    return level.to_dict()
+
+""" Strokes for par: the minimum, plus one if fewer than SOLVER_EASY_SHOTS shots of the grid finish the level from the last position """
+def recommend_par(strokes:int,holing_shots:int) -> int:
+    return strokes + (1 if holing_shots < SOLVER_EASY_SHOTS else 0)
+
+def distance_to_hole(pos,end) -> float:
+    return math.hypot(pos[0] + BALL_RADIUS - end[0] - HOLE_RADIUS/2,pos[1] + BALL_RADIUS - end[1] - HOLE_RADIUS/2)
+
+
+# The level each worker process simulates on, built once per worker so it isnt sent along with every task
+_worker_level = None
+
+def init_worker(level):
+    global _worker_level
+    _worker_level = level if isinstance(level,BatchLevel) else BatchLevel(level)
+
+"""
+    Runs in a worker. `task` is (state indices, start positions, shots, start frame, whether the positions are exact),
+    with one row per shot.
+    RETURNS (state indices, shots, BatchResult)
+"""
+def simulate_task(task):
+    indices,starts,shots,frame,exact_start = task
+    return indices,shots,simulate_shots(_worker_level,shots,start=starts,start_frame=frame,exact_start=exact_start)
+
+""" Every shot of `grid` from every state of `beam`, split into about `chunks` tasks. States on the same frame share tasks """
+def make_tasks(beam,grid,frames_matter:bool,chunks:int) -> list:
+    groups = {}
+    for i,state in enumerate(beam):
+        groups.setdefault(state.frame if frames_matter else 0,[]).append(i)
+    # only ball_start gets rounded like a new ball, every later shot starts exactly where the last one stopped
+    exact_start = bool(beam[0].shots)
+    tasks = []
+    for frame,indices in groups.items():
+        indices = np.repeat(np.array(indices,dtype=np.int64),len(grid))
+        starts = np.array([beam[i].pos for i in indices[::len(grid)]],dtype=np.float64).repeat(len(grid),axis=0)
+        shots = np.tile(grid,(len(indices)//len(grid),1))
+        n = max(1,min(chunks,math.ceil(len(indices) / SOLVER_MIN_TASK)))
+        for part in np.array_split(np.arange(len(indices)),n):
+            tasks.append((indices[part],starts[part],shots[part],frame,exact_start))
+    return tasks
+
+
+"""
+    Finds the fewest strokes for `level` (see level_dict_of for what it can be).
+    `workers` processes share the simulation (1 runs everything in this process)
+"""
+def solve(level,max_strokes:int=SOLVER_MAX_STROKES,beam_width:int=SOLVER_BEAM_WIDTH,workers:int=None,
+          angles:int=SOLVER_ANGLES,powers:int=SOLVER_POWERS,epsilon:float=SOLVER_EPSILON) -> SolveResult:
+    level_dict = level_dict_of(level)
+    end = level_dict.get('ball_end') or (10,10)
+    start = level_dict.get('ball_start') or (0,0)
+    grid = shot_grid(angles,powers)
+    workers = workers or os.cpu_count() or 1
+    batch_level = BatchLevel(level_dict)
+    # without moving blocks it doesnt matter on which frame a shot is taken, so every position can go into the same batch
+    frames_matter = bool(batch_level.moving)
+
+    def cell(pos):
+        return round(pos[0] / epsilon),round(pos[1] / epsilon)
+
+    t = time.perf_counter()
+    result = SolveResult(None)
+    seen = {cell(start)}
+    beam = [SearchState(tuple(start),0,())]
+    pool = multiprocessing.Pool(workers,init_worker,(level_dict,)) if workers > 1 else None
+    if pool is None:
+        init_worker(batch_level)
+    try:
+        for stroke in range(1,max_strokes+1):
+            # a few tasks per worker so they all keep busy
+            tasks = make_tasks(beam,grid,frames_matter,workers * 4)
+            outcomes = pool.imap(simulate_task,tasks) if pool else map(simulate_task,tasks)
+
+            holing = {}
+            candidates = {}
+            for indices,shots,batch in outcomes:
+                result.simulated += len(shots)
+                for j in np.nonzero(batch.holed)[0]:
+                    holing.setdefault(int(indices[j]),[]).append(tuple(shots[j]))
+                if holing: continue
+                for j in range(len(shots)):
+                    pos = tuple(float(v) for v in batch.exact[j])
+                    key = cell(pos)
+                    if key in seen: continue
+                    seen.add(key)
+                    state = beam[indices[j]]
+                    candidates[key] = SearchState(pos,state.frame + int(batch.frames[j]),state.shots + (tuple(shots[j]),))
+
+            if holing:
+                # the position with the most holing shots is the easiest way to finish
+                index,shots = max(holing.items(),key=lambda item: len(item[1]))
+                result.strokes = stroke
+                # shots are in angle order, the one in the middle of the holing ones has the most room for error
+                result.shots = [tuple(float(v) for v in s) for s in beam[index].shots + (shots[len(shots)//2],)]
+                result.holing_shots = len(shots)
+                result.par = recommend_par(stroke,len(shots))
+                break
+            if not candidates: break
+            beam = sorted(candidates.values(),key=lambda state: distance_to_hole(state.pos,end))[:beam_width]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    result.seconds = time.perf_counter() - t
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Finds the fewest strokes for a level and recommends a par')
+    parser.add_argument('level',help='level file (JSON or binary)')
+    parser.add_argument('--workers',type=int,default=None,help='worker processes, defaults to the number of CPUs')
+    parser.add_argument('--beam',type=int,default=SOLVER_BEAM_WIDTH,help='positions kept after every stroke')
+    parser.add_argument('--max-strokes',type=int,default=SOLVER_MAX_STROKES)
+    args = parser.parse_args()
+
+    result = solve(args.level,args.max_strokes,args.beam,args.workers)
+    if result.strokes is None:
+        print('no solution within {} strokes ({} shots simulated in {:.1f} s)'.format(args.max_strokes,result.simulated,result.seconds))
+    else:
+        print('minimum strokes {}  par {}  ({} shots simulated in {:.1f} s)'.format(result.strokes,result.par,result.simulated,result.seconds))
+        for i,(angle,power) in enumerate(result.shots):
+            print('  stroke {}: angle {:.1f} power {:.0f}'.format(i+1,angle,power))
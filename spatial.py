@@ -0,0 +1,93 @@
+"""
+    Uniform grid broadphase.
+    Items are bucketed into square cells so collision checks only look at the few cells around a rect instead of every object.
+"""
+
+from constants import *
+from block import MovingBlock
+
+
+class UniformGrid:
+    def __init__(self,cell_size:int=BORDER_SIZE):
+        self.cell_size = cell_size
+        # (cell x, cell y) -> set of items in that cell
+        self.cells = {}
+        # item -> (order, cells it is in). Queries come back sorted by order so callers see items in the same order as their lists
+        self.items = {}
+        # items that move around and need to be re-bucketed every frame
+        self.dynamic = []
+        self.next_order = 0
+
+    def cells_for(self,rect) -> tuple:
+        cs = self.cell_size
+        x0,y0 = rect[0]//cs,rect[1]//cs
+        x1 = (rect[0]+max(rect[2],1)-1)//cs
+        y1 = (rect[1]+max(rect[3],1)-1)//cs
+        return tuple((cx,cy) for cy in range(y0,y1+1) for cx in range(x0,x1+1))
+
+    def insert(self,item,rect,dynamic:bool=False,order=None):
+        if item in self.items: self.remove(item)
+        if order is None:
+            order = self.next_order
+        self.next_order = max(self.next_order,order) + 1
+        cells = self.cells_for(rect)
+        for cell in cells:
+            self.cells.setdefault(cell,set()).add(item)
+        self.items[item] = (order,cells)
+        if dynamic:
+            self.dynamic.append(item)
+
+    def remove(self,item):
+        entry = self.items.pop(item,None)
+        if entry is None: return
+        for cell in entry[1]:
+            bucket = self.cells.get(cell)
+            if bucket is None: continue
+            bucket.discard(item)
+            if not bucket:
+                del self.cells[cell]
+        if item in self.dynamic:
+            self.dynamic.remove(item)
+
+    def move(self,item,rect):
+        order,old_cells = self.items[item]
+        cells = self.cells_for(rect)
+        # most frames a moving block stays inside the same cells
+        if cells == old_cells: return
+        for cell in old_cells:
+            bucket = self.cells.get(cell)
+            if bucket is None: continue
+            bucket.discard(item)
+            if not bucket:
+                del self.cells[cell]
+        for cell in cells:
+            self.cells.setdefault(cell,set()).add(item)
+        self.items[item] = (order,cells)
+
+    """ Every item sharing a cell with rect, in insertion order. Callers still need to do the exact rect test """
+    def query(self,rect) -> list:
+        found = set()
+        cells = self.cells
+        for cell in self.cells_for(rect):
+            bucket = cells.get(cell)
+            if bucket:
+                found |= bucket
+        items = self.items
+        return sorted(found,key=lambda item: items[item][0])
+
+    def clear(self):
+        self.cells = {}
+        self.items = {}
+        self.dynamic = []
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.items)
+
+
+""" Builds a grid over a level's blocks. Only the moving blocks get re-bucketed when the level is stepped """
+def build_level_grid(objects) -> UniformGrid:
+    grid = UniformGrid(BORDER_SIZE)
+    for i,obj in enumerate(objects):
+        grid.insert(obj,obj.rect(),isinstance(obj.inner,MovingBlock),i)
+    return grid
@@ -0,0 +1,45 @@
+"""
+    Startup timing. Run the game with --startup-profile to get a report of how long each startup phase took,
+    up to the first frame being on screen.
+"""
+
+import time
+from contextlib import contextmanager
+
+# as close to the process starting as we can get without help from the interpreter
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfile:
+    def __init__(self,start:float=PROCESS_START):
+        self.start = start
+        # [(phase name, seconds)] in the order they ran
+        self.phases = []
+        self.first_frame = None
+
+    @contextmanager
+    def phase(self,name:str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name,time.perf_counter() - t))
+
+    """ Records everything between the process starting and now as one phase (the imports of the main module) """
+    def mark_since_start(self,name:str):
+        accounted = sum(seconds for _,seconds in self.phases)
+        self.phases.append((name,time.perf_counter() - self.start - accounted))
+
+    """ Call once the first frame is on screen, whatever happened since the last phase is counted as drawing it """
+    def mark_first_frame(self):
+        if self.first_frame is None:
+            self.mark_since_start('first frame')
+            self.first_frame = time.perf_counter() - self.start
+
+    def report(self) -> str:
+        lines = ['startup profile']
+        for name,seconds in self.phases:
+            lines.append('  {:<20} {:8.1f} ms'.format(name,seconds*1000))
+        if self.first_frame is not None:
+            lines.append('  {:<20} {:8.1f} ms'.format('time to first frame',self.first_frame*1000))
+        return '\n'.join(lines)
@@ -0,0 +1,27 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+
+from level import Level
+from serde import level_dict_to_binary, BinaryLevel
+from replay import level_content_hash
+
+MOVING_LEVEL = {
+    'ball_start':[100,100],
+    'ball_end':[600,400],
+    'objects':[
+        {'inner':{'rect':{'x':0,'y':0,'w':1280,'h':30}}},
+        {'inner':{'rect':{'x':300,'y':200,'w':60,'h':30},'speed':2,'current_checkpoint':0,
+                  'checkpoints':[{'x':300,'y':200},{'x':300,'y':450}]}},
+        {'inner':{'rect':{'x':700,'y':300,'w':30,'h':90},'speed':1.5,'current_checkpoint':1,
+                  'checkpoints':[{'x':700,'y':300},{'x':900,'y':300}]}},
+    ],
+}
+
+def test_content_hash_same_for_json_and_binary():
+    from_json = Level(None,(0,0),(0,0),[])
+    from_json.from_dict(MOVING_LEVEL)
+    from_binary = Level(None,(0,0),(0,0),[])
+    from_binary.from_binary(BinaryLevel(level_dict_to_binary(MOVING_LEVEL)))
+    assert from_binary.to_dict()['objects'] == from_json.to_dict()['objects']
+    assert level_content_hash(from_binary) == level_content_hash(from_json)
@@ -0,0 +1,27 @@
+"""
+    Shared cache for rendered text.
+    Font.render is one of the most expensive things we do in a frame, and most strings on screen never change,
+    so every piece of UI renders text through render_text instead of calling font.render itself.
+"""
+
+from collections import OrderedDict
+
+from constants import *
+
+_cache = OrderedDict()
+
+"""
+    Same as font.render(text,antialias,color), but reuses the surface if we rendered the same thing recently.
+    The returned surface is shared, so only blit it, never draw onto it
+"""
+def render_text(font,text,antialias,color):
+    key = (font,text,antialias,tuple(color))
+    surf = _cache.get(key)
+    if surf is not None:
+        _cache.move_to_end(key)
+        return surf
+    surf = font.render(text,antialias,color)
+    _cache[key] = surf
+    while len(_cache) > TEXT_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return surf
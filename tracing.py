@@ -0,0 +1,188 @@
+"""
+    Opt-in timeline recorder, writes spans in the Chrome Trace Event format so a session can be opened in
+    chrome://tracing or ui.perfetto.dev. Start it with `python main.py --trace session.json` (a .jsonl path writes one event per line).
+
+    Recording a span only appends a tuple to a bounded ring buffer, turning it into JSON and writing it happens on a
+    background thread. If that thread falls behind, the oldest events get dropped instead of the game waiting for the disk.
+"""
+
+import json
+import time
+import functools
+import threading
+from collections import deque
+
+from constants import *
+
+# The recorder spans go to, None while tracing is off (then span() does nothing)
+active = None
+
+
+class _NoSpan:
+    def __enter__(self): return self
+    def __exit__(self,*exc): return False
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+    __slots__ = ('recorder','name','cat','args','start')
+
+    def __init__(self,recorder,name,cat,args):
+        self.recorder = recorder
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        self.recorder.complete(self.name,self.cat,self.start,time.perf_counter(),self.args)
+        return False
+
+""" with tracing.span('Level.update','physics'): ... records how long the block took, if tracing is on """
+def span(name:str,cat:str='game',**args):
+    if active is None: return NO_SPAN
+    return Span(active,name,cat,args or None)
+
+""" Records a span from `start` to `end` (both time.perf_counter() values), for code that already has the times at hand """
+def complete(name:str,cat:str,start:float,end:float,**args):
+    if active is not None:
+        active.complete(name,cat,start,end,args or None)
+
+""" Records a point in time without a duration """
+def instant(name:str,cat:str='game',**args):
+    if active is not None:
+        active.instant(name,cat,args or None)
+
+""" Decorator, every call to the function becomes a span named after it """
+def traced(cat:str='game'):
+    def decorate(fn):
+        name = fn.__qualname__
+        @functools.wraps(fn)
+        def wrapper(*args,**kwargs):
+            if active is None: return fn(*args,**kwargs)
+            with Span(active,name,cat,None):
+                return fn(*args,**kwargs)
+        return wrapper
+    return decorate
+
+
+class TraceRecorder:
+    def __init__(self,path:str,capacity:int=TRACE_BUFFER_SIZE,flush_interval:float=TRACE_FLUSH_INTERVAL):
+        self.path = path
+        self.jsonl = path.endswith('.jsonl')
+        # (phase, name, cat, start, duration, thread id, args), deque appends are thread safe and drop the oldest once full
+        self.buffer = deque(maxlen=capacity)
+        self.flush_interval = flush_interval
+        self.origin = time.perf_counter()
+        self.pid = 1
+        self.thread_names = {}
+        self.recorded = 0
+        self.written = 0
+        self.file = None
+        self.first_event = True
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.file = open(self.path,'w')
+        if not self.jsonl:
+            self.file.write('[\n')
+        self.thread = threading.Thread(target=self.run,name='trace-writer',daemon=True)
+        self.thread.start()
+        return self
+
+    def record(self,event):
+        tid = event[5]
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        self.buffer.append(event)
+        self.recorded += 1
+
+    def complete(self,name,cat,start,end,args=None):
+        self.record(('X',name,cat,start,end - start,threading.get_ident(),args))
+
+    def instant(self,name,cat,args=None):
+        self.record(('i',name,cat,time.perf_counter(),0.0,threading.get_ident(),args))
+
+    @property
+    def dropped(self) -> int:
+        return max(0,self.recorded - self.written - len(self.buffer))
+
+    def to_json(self,event) -> dict:
+        ph,name,cat,start,dur,tid,args = event
+        d = {'name':name,'cat':cat,'ph':ph,'ts':round((start - self.origin) * 1e6,3),'pid':self.pid,'tid':tid}
+        if ph == 'X':
+            d['dur'] = round(dur * 1e6,3)
+        else:
+            # instant events are scoped to their thread
+            d['s'] = 't'
+        if args:
+            d['args'] = args
+        return d
+
+    def write_events(self,events):
+        if not events: return
+        lines = [json.dumps(self.to_json(event),separators=(',',':')) for event in events]
+        if self.jsonl:
+            self.file.write('\n'.join(lines) + '\n')
+        else:
+            if not self.first_event:
+                self.file.write(',\n')
+            self.file.write(',\n'.join(lines))
+        self.first_event = False
+        self.written += len(events)
+
+    """ Writes out everything in the buffer, a chunk at a time so the game thread gets the GIL back in between """
+    def flush(self):
+        while self.buffer:
+            chunk = []
+            while self.buffer and len(chunk) < TRACE_FLUSH_CHUNK:
+                chunk.append(self.buffer.popleft())
+            self.write_events(chunk)
+            time.sleep(0)
+        self.file.flush()
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    """ Stops the writer thread, writes what is left and closes the file """
+    def close(self):
+        if self.file is None: return
+        self.stop_event.set()
+        self.thread.join()
+        self.flush()
+        # thread names, so the viewer shows 'MainThread' and 'level-loader' instead of thread ids
+        meta = [{'name':'thread_name','ph':'M','pid':self.pid,'tid':tid,'args':{'name':name}} for tid,name in self.thread_names.items()]
+        meta.append({'name':'process_name','ph':'M','pid':self.pid,'tid':0,'args':{'name':'Shoot Your Shot'}})
+        if self.dropped:
+            meta.append({'name':'dropped_events','ph':'M','pid':self.pid,'tid':0,'args':{'count':self.dropped}})
+        lines = [json.dumps(m,separators=(',',':')) for m in meta]
+        if self.jsonl:
+            self.file.write('\n'.join(lines) + '\n')
+        else:
+            if not self.first_event:
+                self.file.write(',\n')
+            self.file.write(',\n'.join(lines) + '\n]\n')
+        self.file.close()
+        self.file = None
+
+
+""" Starts recording to `path`. RETURNS the recorder """
+def start(path:str) -> TraceRecorder:
+    global active
+    stop()
+    active = TraceRecorder(path).start()
+    return active
+
+""" Stops recording (if it was on) and finishes the trace file """
+def stop():
+    global active
+    recorder,active = active,None
+    if recorder is not None:
+        recorder.close()
@@ -1,6 +1,9 @@
 import os, math
+from collections import OrderedDict
 import pygame
 from constants import *
+from textcache import render_text
+import assets
 
 # Fonts
 def load_game_font(size):
@@ -41,32 +44,81 @@ def load_icon(path, size=ICON_SIZE):
     except Exception:
         return img
 
-BG_IMG = load_image(BACKGROUND_IMAGE)
-MUSIC_ICON = load_icon(MUSIC_ICON_PATH, ICON_SIZE)
-SFX_ICON = load_icon(SFX_ICON_PATH, ICON_SIZE)
+# decoded the first time they are drawn, get them with assets.get(name)
+assets.register('background', 'image', lambda: load_image(BACKGROUND_IMAGE), BACKGROUND_IMAGE)
+assets.register('music_icon', 'image', lambda: load_icon(MUSIC_ICON_PATH, ICON_SIZE), MUSIC_ICON_PATH)
+assets.register('sfx_icon', 'image', lambda: load_icon(SFX_ICON_PATH, ICON_SIZE), SFX_ICON_PATH)
+
+# Scaled backgrounds, keyed on (image, target size, quantized zoom). Oldest entries get dropped first once it is full
+_bg_cache = OrderedDict()
+
+def quantize_zoom(zoom):
+    return round(zoom / ZOOM_QUANTUM)
+
+# Returns (surface, pos): the part of the scaled background that lands on a target of `size`, and where to blit it
+def get_scaled_bg(img, size, zoom):
+    key = (id(img), size, quantize_zoom(zoom))
+    entry = _bg_cache.get(key)
+    # the id check alone could match a new image that reused a freed one's id
+    if entry is not None and entry[2] is img:
+        _bg_cache.move_to_end(key)
+        return entry[0], entry[1]
 
-def blit_bg_with_zoom(surface, img, zoom):
-    if img is None:
-        surface.fill(GREEN_BG); return
     iw, ih = img.get_size()
-    sw, sh = surface.get_size()
+    sw, sh = size
     base_scale = max(sw / iw, sh / ih)
-    scale = base_scale * zoom
+    scale = base_scale * quantize_zoom(zoom) * ZOOM_QUANTUM
     new_size = (int(iw * scale), int(ih * scale))
     scaled = pygame.transform.smoothscale(img, new_size)
     x = (sw - new_size[0]) // 2
     y = (sh - new_size[1]) // 2
-    surface.blit(scaled, (x, y))
+    # only keep what is actually on screen, zooming in makes the rest a lot of wasted memory
+    visible = pygame.Rect(x, y, new_size[0], new_size[1]).clip(pygame.Rect(0, 0, sw, sh))
+    cropped = scaled.subsurface(visible.move(-x, -y)).copy()
 
-def draw_geometric_overlay(surface):
-    overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
+    _bg_cache[key] = (cropped, visible.topleft, img)
+    while len(_bg_cache) > BG_CACHE_SIZE:
+        _bg_cache.popitem(last=False)
+    return cropped, visible.topleft
+
+def prerender_bg_zooms(img, size, zooms):
+    if img is None: return
+    for zoom in zooms:
+        get_scaled_bg(img, size, zoom)
+
+def clear_bg_cache():
+    _bg_cache.clear()
+
+def blit_bg_with_zoom(surface, img, zoom):
+    if img is None:
+        surface.fill(GREEN_BG); return
+    scaled, pos = get_scaled_bg(img, surface.get_size(), zoom)
+    surface.blit(scaled, pos)
+
+# Layers that never change for a given screen size (overlay, titles ...). key -> (screen size, surface)
+_layers = {}
+
+# Returns build(size), only calling it again when the screen size changes
+def get_layer(key, size, build):
+    entry = _layers.get(key)
+    if entry is None or entry[0] != size:
+        entry = (size, build(size))
+        _layers[key] = entry
+    return entry[1]
+
+def build_geometric_overlay(size):
+    sw, sh = size
+    overlay = pygame.Surface((sw, sh), pygame.SRCALPHA)
     for i in range(-3, 14):
-        pts = [(i * 110, 0), ((i + 2) * 110, 0), ((i - 2) * 110, SCREEN_H), ((i - 4) * 110, SCREEN_H)]
+        pts = [(i * 110, 0), ((i + 2) * 110, 0), ((i - 2) * 110, sh), ((i - 4) * 110, sh)]
         alpha = 12 if (i % 2 == 0) else 20
         pygame.draw.polygon(overlay, (255,255,255,alpha), pts)
     pygame.draw.polygon(overlay, (0,0,0,30), [(0,0),(200,0),(0,120)])
-    pygame.draw.polygon(overlay, (255,255,255,20), [(SCREEN_W,SCREEN_H),(SCREEN_W-260,SCREEN_H),(SCREEN_W,SCREEN_H-180)])
-    surface.blit(overlay, (0,0))
+    pygame.draw.polygon(overlay, (255,255,255,20), [(sw,sh),(sw-260,sh),(sw,sh-180)])
+    return overlay
+
+def draw_geometric_overlay(surface):
+    surface.blit(get_layer('overlay', surface.get_size(), build_geometric_overlay), (0,0))
 
 
 # Generic button draw that returns actual drawn rect
@@ -91,7 +143,7 @@ def draw_button_scaled(surface, base_rect, text, hover_val, scale_override=1.0,
     pygame.draw.rect(surface, color, rect, border_radius=12)
     pygame.draw.rect(surface, border_color, rect, width=border_width, border_radius=12)
 
-    txt_surf = BUTTON_FONT.render(text, True, ACCENT)
+    txt_surf = render_text(BUTTON_FONT, text, True, ACCENT)
     surface.blit(txt_surf, txt_surf.get_rect(center=rect.center))
     return rect
 
@@ -104,7 +156,17 @@ def get_inflated_drawn(ui_drawn, key):
         return pygame.Rect(BUTTON_X, PLAY_Y, BUTTON_W, BUTTON_H).inflate(CLICK_PAD, CLICK_PAD)
 
 
-TITLE_FONT = load_game_font(65)
-BUTTON_FONT = load_game_font(30)
-SETTINGS_FONT = load_game_font(28)
-SMALL_FONT = load_game_font(20)
+""" Stands in for load_game_font(size), but the font is only looked up and loaded (through the asset registry) the first time it is used """
+class GameFont:
+    def __init__(self, size):
+        self.size = size
+        self.asset_name = "game_font_{}".format(size)
+        assets.register(self.asset_name, 'font', lambda: load_game_font(size), "game font {}px".format(size))
+
+    def __getattr__(self, name):
+        return getattr(assets.get(self.asset_name), name)
+
+TITLE_FONT = GameFont(65)
+BUTTON_FONT = GameFont(30)
+SETTINGS_FONT = GameFont(28)
+SMALL_FONT = GameFont(20)